@@ -0,0 +1,94 @@
+"""
+Compare fan-out throughput of ``ForkedOutputCollection`` against the previous
+implementation, which spawned a greenlet per port for every packet.
+
+Usage::
+
+    python benchmarks/fanout.py [--packets N] [--width N] [--capacity N]
+"""
+from __future__ import print_function
+
+import argparse
+import logging
+import time
+
+import gevent.pool
+
+import rill.engine.utils
+rill.engine.utils.patch()
+
+from rill import *
+from rill.engine.network import Graph, run_graph
+from rill.engine.outputport import BaseOutputCollection
+from rill.fn import current_component, forked
+
+
+class GreenletForkedOutputCollection(BaseOutputCollection):
+    """
+    The previous ``ForkedOutputCollection``, kept for comparison
+    """
+    def send(self, packet):
+        group = gevent.pool.Group()
+        failed = list(group.imap_unordered(lambda x: x.send(packet.clone()),
+                                           self.ports()))
+        return any(failed)
+
+
+@component
+@inport("COUNT", type=int)
+@outport("OUT", array=True)
+def ForkInline(COUNT, OUT):
+    outports = forked(OUT)
+    for i in range(COUNT.receive_once()):
+        p = current_component().create(i)
+        outports.send(p)
+        p.drop()
+
+
+@component
+@inport("COUNT", type=int)
+@outport("OUT", array=True)
+def ForkGreenlets(COUNT, OUT):
+    outports = GreenletForkedOutputCollection(current_component(), [OUT])
+    for i in range(COUNT.receive_once()):
+        p = current_component().create(i)
+        outports.send(p)
+        p.drop()
+
+
+@component
+@inport("IN")
+def Drop(IN):
+    for p in IN:
+        p.drop()
+
+
+def run(fork_type, packets, width, capacity):
+    graph = Graph(default_capacity=capacity)
+    graph.add_component("Fork", fork_type, COUNT=packets)
+    for i in range(width):
+        graph.add_component("Drop%d" % i, Drop)
+        graph.connect("Fork.OUT[%d]" % i, "Drop%d.IN" % i)
+    start = time.time()
+    run_graph(graph)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--packets', type=int, default=5000)
+    parser.add_argument('--width', type=int, default=16)
+    parser.add_argument('--capacity', type=int, default=10)
+    args = parser.parse_args()
+    # logging would dominate the timings
+    logging.disable(logging.WARNING)
+
+    for name, fork_type in [('greenlets', ForkGreenlets),
+                            ('inline', ForkInline)]:
+        elapsed = run(fork_type, args.packets, args.width, args.capacity)
+        print("{:<10} {:>8.3f}s  {:>10.0f} packets/s".format(
+            name, elapsed, args.packets * args.width / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Measure the time taken to import rill's entry points, and which optional
+dependencies each of them loads.
+
+Each import runs in a fresh interpreter, so that nothing is cached between
+measurements.
+
+Usage::
+
+    python benchmarks/import_time.py [--repeat N] [module ...]
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import subprocess
+import sys
+
+MODULES = [
+    'rill',
+    'rill.engine.network',
+    'rill.runtime',
+    'rill.cli',
+]
+
+# modules which should only be loaded when they are actually needed
+OPTIONAL = [
+    'schematics',
+    'geventwebsocket',
+]
+
+SCRIPT = """
+import json, sys, time
+start = time.time()
+import {module}
+elapsed = time.time() - start
+import rill.engine.utils
+print(json.dumps({{
+    'elapsed': elapsed,
+    'loaded': [m for m in {optional!r} if m in sys.modules],
+    'patched': rill.engine.utils.is_patched,
+}}))
+"""
+
+
+def measure(module):
+    output = subprocess.check_output(
+        [sys.executable, '-c',
+         SCRIPT.format(module=module, optional=OPTIONAL)])
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        results = [measure(module) for _ in range(args.repeat)]
+        best = min(r['elapsed'] for r in results)
+        print("{:<22} {:>8.1f}ms  patched={!s:<5}  loaded: {}".format(
+            module, best * 1000, results[0]['patched'],
+            ', '.join(results[0]['loaded']) or '-'))
+
+
+if __name__ == '__main__':
+    main()
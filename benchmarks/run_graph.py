@@ -0,0 +1,59 @@
+"""
+Measure the per-call cost of running a small graph like a function, with
+``run_graph`` and through a ``GraphService``.
+
+Usage::
+
+    python benchmarks/run_graph.py [--repeat N] [--debug]
+"""
+from __future__ import print_function
+
+import argparse
+import logging
+import time
+
+
+def make_graph():
+    from rill.engine.network import Graph
+    from rill.components.text import Prefix
+
+    graph = Graph()
+    graph.add_component('Prefix', Prefix, PRE='x')
+    graph.export('Prefix.IN', 'IN')
+    graph.export('Prefix.OUT', 'OUT')
+    return graph
+
+
+def measure(func, repeat):
+    start = time.time()
+    for i in range(repeat):
+        func({'IN': str(i)})
+    return (time.time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=500)
+    parser.add_argument('--debug', action='store_true',
+                        help="keep the components' debug logging enabled")
+    args = parser.parse_args()
+
+    from rill.engine.network import run_graph
+    from rill.service import GraphService
+    if not args.debug:
+        logging.getLogger('rill.engine.component').setLevel(logging.WARNING)
+
+    graph = make_graph()
+    # Prefix does not keep request ids, but responds in order
+    service = GraphService(make_graph(), ordered=True)
+    service.start()
+    for name, func in [
+            ('run_graph', lambda values: run_graph(graph, values, True)),
+            ('GraphService.call', lambda values: service.call(values['IN']))]:
+        print("{:<22} {:>8.3f}ms".format(
+            name, measure(func, args.repeat) * 1000))
+    service.stop()
+
+
+if __name__ == '__main__':
+    main()
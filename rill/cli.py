@@ -1,10 +1,16 @@
-from rill.engine.utils import patch
-patch()
 import argparse
-from rill.runtime import DEFAULTS, Runtime, serve_runtime
 
 
 def main():
+    # the runtime serves its clients from greenlets, so it needs the stdlib
+    # patched. this is done here rather than at import, so that importing rill
+    # never patches as a side effect.
+    from rill.engine.utils import patch
+    patch()
+    from rill.runtime import DEFAULTS, Runtime, serve_runtime
+    from rill.discovery import ComponentCache
+    from rill.executors import GreenletExecutor, ProcessExecutor
+
     # Parse arguments
     argp = argparse.ArgumentParser(
         description='Runtime that responds to commands sent over the network, '
@@ -29,6 +35,15 @@ def main():
     argp.add_argument(
         '-m', '--module', dest='modules', action='append', default=[],
         help='Module to load')
+    argp.add_argument(
+        '--component-cache', nargs='?', const='', metavar='FILE_PATH',
+        help='Cache component specs, so that modules are only imported when '
+             'their components are used (default file: %s)' %
+             ComponentCache.default_path)
+    argp.add_argument(
+        '--executor', choices=['greenlet', 'process'], default='greenlet',
+        help='Run each graph in a greenlet of the runtime, or in its own '
+             'worker process (default: %(default)s)')
     argp.add_argument(
         '-v', '--verbose', action='store_true',
         help='Enable verbose logging')
@@ -49,7 +64,15 @@ def main():
     #                       'rill.executors': logging.INFO
     #                   })
 
-    runtime = Runtime()
+    if args.component_cache is not None:
+        component_cache = ComponentCache(args.component_cache or None)
+    else:
+        component_cache = None
+    if args.executor == 'process':
+        executor_class = ProcessExecutor
+    else:
+        executor_class = GreenletExecutor
+    runtime = Runtime(component_cache, executor_class)
 
     for modname in args.modules:
         runtime.register_module(modname)
@@ -0,0 +1,117 @@
+import operator
+import time
+
+from rill import *
+from rill.components.timing import _receive, _TIMEOUT
+from rill.engine.exceptions import FlowError
+from rill.compat import *
+
+
+def _min(acc, value):
+    return value if acc is None or value < acc else acc
+
+
+def _max(acc, value):
+    return value if acc is None or value > acc else acc
+
+
+def _collect(acc, value):
+    acc.append(value)
+    return acc
+
+
+# map of reducer name to (initial value factory, step function)
+REDUCERS = {
+    'count': (lambda: 0, lambda acc, value: acc + 1),
+    'sum': (lambda: 0, operator.add),
+    'min': (lambda: None, _min),
+    'max': (lambda: None, _max),
+    'collect': (list, _collect),
+}
+
+
+def get_reducer(reducer):
+    """
+    Get the initial value factory and step function for a reducer.
+
+    Parameters
+    ----------
+    reducer : Union[str, Tuple[Callable[[], Any], Callable[[Any, Any], Any]]]
+        name of a reducer in `REDUCERS`, or an (initial, step) pair
+
+    Returns
+    -------
+    Tuple[Callable[[], Any], Callable[[Any, Any], Any]]
+    """
+    if isinstance(reducer, basestring):
+        try:
+            return REDUCERS[reducer]
+        except KeyError:
+            raise FlowError("Unknown reducer {!r}. Choose from: {}".format(
+                reducer, ', '.join(sorted(REDUCERS))))
+    initial, step = reducer
+    return initial, step
+
+
+@component
+@inport("IN", description="Packets to be aggregated")
+@inport("KEY", description="Function used to extract a grouping key from "
+                           "each packet's contents")
+@inport("VALUE", description="Function used to extract the value to be "
+                             "reduced from each packet's contents")
+@inport("REDUCER", description="Name of a reducer (count, sum, min, max, "
+                               "collect) or an (initial, step) pair",
+        default='count')
+@inport("FLUSH_SIZE", description="Flush when this many keys are held",
+        type=int)
+@inport("FLUSH_INTERVAL", description="Flush when this many seconds have "
+                                      "passed since the last flush",
+        type=float)
+@outport("OUT", description="(key, aggregate) pairs", type=tuple)
+def GroupBy(IN, KEY, VALUE, REDUCER, FLUSH_SIZE, FLUSH_INTERVAL, OUT):
+    """
+    Aggregate packets by key
+
+    A dict of per-key accumulators is kept, and a (key, aggregate) pair is
+    sent for each key at the end of the stream. If FLUSH_SIZE or
+    FLUSH_INTERVAL are set, the accumulators are also flushed when the limit is
+    reached, in which case a key may be sent more than once. The interval is
+    also checked while waiting for packets, so held keys are flushed on time
+    even if the stream goes idle.
+    """
+    key = KEY.receive_once()
+    value = VALUE.receive_once()
+    initial, step = get_reducer(REDUCER.receive_once())
+    flush_size = FLUSH_SIZE.receive_once()
+    flush_interval = FLUSH_INTERVAL.receive_once()
+
+    accumulators = {}
+
+    def flush():
+        for k, acc in accumulators.items():
+            OUT.send((k, acc))
+        accumulators.clear()
+
+    last_flush = time.time()
+    while True:
+        timeout = None
+        if flush_interval and accumulators:
+            timeout = last_flush + flush_interval - time.time()
+        p = _receive(IN, timeout)
+        if p is None:
+            break
+        if p is not _TIMEOUT:
+            content = p.drop()
+            k = content if key is None else key(content)
+            v = content if value is None else value(content)
+            acc = accumulators[k] if k in accumulators else initial()
+            accumulators[k] = step(acc, v)
+
+        if flush_size and len(accumulators) >= flush_size:
+            flush()
+            last_flush = time.time()
+        elif flush_interval and time.time() - last_flush >= flush_interval:
+            flush()
+            last_flush = time.time()
+
+    flush()
@@ -1,6 +1,10 @@
 from rill import *
 from rill.fn import range
 import itertools
+import heapq
+import pickle
+import sys
+import tempfile
 
 
 @component
@@ -35,6 +39,41 @@ def Inject(CONST, OUT):
         OUT.send(c)
 
 
+@component
+@outport("OUT")
+@inport("IN", description="Iterable whose items are sent as separate packets")
+def ReadIterable(IN, OUT):
+    """
+    Send each item of an iterable as a separate packet.
+
+    Items are only taken from the iterable as OUT accepts them, so a lazy
+    iterable is never held in memory as a whole.
+    """
+    iterable = IN.receive_once()
+    if iterable is None:
+        return
+    for item in iterable:
+        if OUT.is_closed():
+            break
+        OUT.send(item)
+
+
+@component
+@inport("IN", description="Packets whose contents are put on the queue")
+@inport("QUEUE", description="Queue to put contents on, such as a "
+                             "gevent.queue.Queue")
+def WriteQueue(IN, QUEUE):
+    """
+    Put the contents of each packet on a queue.
+
+    A bounded queue which is full blocks the component, and so applies
+    backpressure to the network.
+    """
+    queue = QUEUE.receive_once()
+    for content in IN.iter_contents():
+        queue.put(content)
+
+
 @component
 @outport("OUT", description="Single packet containing blank", type=str)
 def Kick(OUT):
@@ -175,6 +214,172 @@ def Sort(IN, MAX, OUT):
         n -= 1
 
 
+def _spill_run(run):
+    """
+    Write a sorted run of values to a temporary file.
+
+    Returns
+    -------
+    file
+        temporary file, rewound to the beginning
+    """
+    f = tempfile.TemporaryFile()
+    for value in run:
+        pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+    f.seek(0)
+    return f
+
+
+def _iter_run(f):
+    """
+    Iterate over the values of a run written by `_spill_run`, closing the file
+    once it is exhausted.
+    """
+    try:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                break
+    finally:
+        f.close()
+
+
+def _merge_runs(runs, key):
+    """
+    K-way merge of sorted iterables using a heap.
+
+    Ties are broken by run index, so the merge is stable.
+    """
+    heap = []
+    for i, run in enumerate(runs):
+        it = iter(run)
+        for value in it:
+            heap.append((key(value), i, value, it))
+            break
+    heapq.heapify(heap)
+    while heap:
+        k, i, value, it = heap[0]
+        yield value
+        for value in it:
+            heapq.heapreplace(heap, (key(value), i, value, it))
+            break
+        else:
+            heapq.heappop(heap)
+
+
+@component
+@inport("IN", description="Packets to be sorted")
+@inport("KEY", description="Function used to extract a comparison key from "
+                           "each packet's contents")
+@inport("BUFFER", description="Approximate number of bytes to hold in memory "
+                              "before spilling a sorted run to disk",
+        type=int, default=64 * 1024 * 1024)
+@outport("OUT", description="Output port")
+def ExternalSort(IN, KEY, BUFFER, OUT):
+    """
+    Sort a stream of arbitrary size to an output stream
+
+    Sorted runs are built in memory until BUFFER bytes are used, then spilled
+    to temporary files. The runs are then merged with a heap, so output is
+    streamed while the merge progresses.
+    """
+    key = KEY.receive_once()
+    if key is None:
+        key = lambda x: x
+    budget = BUFFER.receive_once()
+
+    # note that sys.getsizeof() does not account for the contents of
+    # containers, so the budget is only an estimate
+    runs = []
+    run = []
+    size = 0
+    for value in IN.iter_contents():
+        run.append(value)
+        size += sys.getsizeof(value)
+        if size >= budget:
+            run.sort(key=key)
+            runs.append(_spill_run(run))
+            run = []
+            size = 0
+
+    run.sort(key=key)
+    if not runs:
+        merged = run
+    else:
+        # the final run stays in memory
+        merged = _merge_runs([_iter_run(f) for f in runs] + [run], key)
+
+    try:
+        for value in merged:
+            if OUT.is_closed():
+                break
+            OUT.send(value)
+    finally:
+        for f in runs:
+            f.close()
+
+
+@component
+@inport("IN", description="Packets to be ranked")
+@inport("K", description="Number of packets to keep", type=int,
+        required=True)
+@inport("KEY", description="Function used to extract a comparison key from "
+                           "each packet's contents")
+@inport("LARGEST", description="Keep the largest packets instead of the "
+                               "smallest", type=bool, default=False)
+@outport("OUT", description="Output port")
+def TopK(IN, K, KEY, LARGEST, OUT):
+    """
+    Send the K smallest (or largest) packets of a stream, in sorted order
+
+    Only K packets are held in memory at any time.
+    """
+    k = K.receive_once()
+    key = KEY.receive_once()
+    largest = LARGEST.receive_once()
+    if k is None:
+        return
+
+    select = heapq.nlargest if largest else heapq.nsmallest
+    for value in select(k, IN.iter_contents(), key=key):
+        if OUT.is_closed():
+            break
+        OUT.send(value)
+
+
+@component
+@inport("IN", description="Packets to be sorted")
+@inport("SIZE", description="Number of packets held in the sort window",
+        type=int, required=True)
+@inport("KEY", description="Function used to extract a comparison key from "
+                           "each packet's contents")
+@outport("OUT", description="Output port")
+def WindowedSort(IN, SIZE, KEY, OUT):
+    """
+    Sort a stream of packets that is out of order by at most SIZE positions
+
+    Once the window is full, the smallest packet is sent for each packet
+    received, so output starts flowing immediately and memory stays bounded.
+    Packets with equal keys retain their input order.
+    """
+    size = SIZE.receive_once()
+    key = KEY.receive_once()
+    if size is None:
+        return
+    if key is None:
+        key = lambda x: x
+
+    heap = []
+    for i, p in enumerate(IN.iter_packets()):
+        heapq.heappush(heap, (key(p.get_contents()), i, p))
+        if len(heap) > size:
+            OUT.send(heapq.heappop(heap)[2])
+
+    while heap:
+        OUT.send(heapq.heappop(heap)[2])
+
+
 @component
 @inport("IN", description="Packets to be sorted", type=int)
 @inport("MAX", description="Maximum number of packets to be sorted", type=int,
@@ -1,3 +1,7 @@
+import os
+import glob
+from collections import deque
+
 from rill import *
 from rill.fn import synced
 
@@ -106,3 +110,149 @@ def ReadLines(FILEPATH, OUT):
         except IOError as e:
             logger.error("Failed reading file {}: {}".format(
                 filename, str(e)))
+
+
+# approximate size in bytes of the chunks of lines read by ReadFiles
+_CHUNK_SIZE = 64 * 1024
+
+
+def _iter_chunks(filename, pool):
+    """
+    Iterate over the lines of `filename`, a list of about `_CHUNK_SIZE` bytes
+    at a time, read on a worker thread of `pool`.
+
+    If the file cannot be read or decoded, the error is yielded in place of
+    the remaining lines, so that it reaches the component rather than ending
+    the reader.
+
+    Returns
+    -------
+    Iterator[Union[List[str], Exception]]
+    """
+    try:
+        f = pool.apply(open, (filename, 'r'))
+        try:
+            while True:
+                lines = pool.apply(f.readlines, (_CHUNK_SIZE,))
+                if not lines:
+                    break
+                yield lines
+        finally:
+            f.close()
+    except Exception as e:
+        yield e
+
+
+def _list_files(pattern):
+    """
+    Expand a directory or a glob pattern to a sorted list of file names.
+    """
+    if os.path.isdir(pattern):
+        names = (os.path.join(pattern, n) for n in os.listdir(pattern))
+    else:
+        names = glob.glob(pattern)
+    return sorted(n for n in names if os.path.isfile(n))
+
+
+@component
+@outport("OUT", description="Lines, bracketed per file", type=str)
+@inport("PATTERN", description="Directory or glob pattern", type=str,
+        required=True)
+@inport("CONCURRENCY", description="Maximum number of files read at once",
+        type=int, default=4)
+@inport("ORDERED", description="Emit files in sorted order. If False, files "
+                               "are emitted as soon as they are read",
+        type=bool, default=True)
+def ReadFiles(PATTERN, CONCURRENCY, ORDERED, OUT):
+    """
+    Creates a substream of packets for each line in each file matching a
+    directory or glob pattern.
+
+    Up to CONCURRENCY files are read at once on a pool of worker threads. The
+    lines of each file are surrounded by an open and a close bracket. Files
+    are read in chunks, and reading waits while a file's lines are sent, so
+    memory use does not depend on the size of the files.
+    """
+    import gevent
+    import gevent.queue
+    import gevent.threadpool
+
+    pattern = PATTERN.receive_once()
+    concurrency = max(CONCURRENCY.receive_once(), 1)
+    ordered = ORDERED.receive_once()
+    if pattern is None:
+        return
+
+    filenames = _list_files(pattern)
+    logger.info("Reading {} files matching {}".format(len(filenames),
+                                                      pattern))
+    pool = gevent.threadpool.ThreadPool(concurrency)
+    remaining = iter(filenames)
+    # (filename, chunks) of the files being read, in the order they were
+    # started
+    reading = deque()
+    # files whose first chunk has been read, used when not ordered
+    ready = None if ordered else gevent.queue.Queue()
+    readers = []
+
+    def read(filename, chunks):
+        # puts each chunk on `chunks`, followed by None
+        items = _iter_chunks(filename, pool)
+        first = next(items, None)
+        chunks.put(first)
+        if ready is not None:
+            ready.put((filename, chunks))
+        if first is not None:
+            for item in items:
+                chunks.put(item)
+            chunks.put(None)
+
+    def start_next():
+        for filename in remaining:
+            # keep at most two chunks waiting per file
+            chunks = gevent.queue.Queue(2)
+            reading.append((filename, chunks))
+            readers.append(gevent.spawn(read, filename, chunks))
+            return
+
+    def get_chunk(chunks):
+        # files which cannot be read are skipped, but other errors, such as
+        # undecodable content, are the component's
+        item = chunks.get()
+        if isinstance(item, Exception) and not isinstance(item, IOError):
+            raise item
+        return item
+
+    def send_file(filename, chunks):
+        item = get_chunk(chunks)
+        if isinstance(item, IOError):
+            logger.error("Failed reading file {}: {}".format(
+                filename, str(item)))
+            return
+        OUT.send(Packet.Type.OPEN)
+        while item is not None:
+            if isinstance(item, IOError):
+                logger.error("Failed reading file {}: {}".format(
+                    filename, str(item)))
+                break
+            for line in item:
+                OUT.send(line.rstrip('\n'))
+            item = get_chunk(chunks)
+        OUT.send(Packet.Type.CLOSE)
+
+    try:
+        for _ in range(concurrency):
+            start_next()
+        while reading:
+            if ordered:
+                filename, chunks = reading.popleft()
+            else:
+                filename, chunks = ready.get()
+                reading.remove((filename, chunks))
+            if OUT.is_closed():
+                break
+            send_file(filename, chunks)
+            start_next()
+    finally:
+        gevent.killall(readers)
+        pool.kill()
@@ -31,6 +31,38 @@ def SubstreamSensitiveMerge(IN, OUT):
         OUT.send(p)
 
 
+@component
+@inport("IN", array=True, description="Incoming packets")
+@inport("ROUTE", type=int,
+        description="Index of the IN element to read each packet or "
+                    "substream from")
+@outport("OUT", description="Merged output")
+def OrderedMerge(IN, ROUTE, OUT):
+    """
+    Merge multiple input streams in the order given by ROUTE
+
+    Intended to restore the original order of a stream partitioned by
+    ``PartitionByKey``, whose ROUTE output records where each packet was sent.
+    Each element stream must produce exactly one packet (or substream) per
+    packet (or substream) that it received.
+    """
+    for index in ROUTE.iter_contents():
+        inport = IN[index]
+        substream_level = 0
+        while True:
+            p = inport.receive()
+            if p is None:
+                IN.close()
+                return
+            if p.get_type() == Packet.Type.OPEN:
+                substream_level += 1
+            elif p.get_type() == Packet.Type.CLOSE:
+                substream_level -= 1
+            OUT.send(p)
+            if substream_level == 0:
+                break
+
+
 @component
 @outport("IN", array=True, description="Incoming packets")
 @inport("OUT", description="Merged output")
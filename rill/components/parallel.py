@@ -0,0 +1,208 @@
+from collections import deque
+
+import gevent
+import gevent.event
+
+from rill import *
+from rill.engine.exceptions import FlowError
+
+
+class _GreenletExecutor(object):
+    def __init__(self, workers):
+        import gevent.pool
+        self.pool = gevent.pool.Pool(workers)
+
+    def submit(self, func, value):
+        return self.pool.spawn(func, value)
+
+    def shutdown(self):
+        self.pool.kill()
+
+
+class _ThreadExecutor(object):
+    def __init__(self, workers):
+        import gevent.threadpool
+        self.pool = gevent.threadpool.ThreadPool(workers)
+
+    def submit(self, func, value):
+        return self.pool.spawn(func, value)
+
+    def shutdown(self):
+        self.pool.kill()
+
+
+def _process_worker(reader, writer):
+    """
+    Run in a child process: apply functions received on `reader` until None is
+    received, and send the results on `writer`.
+    """
+    while True:
+        task = reader.recv()
+        if task is None:
+            break
+        func, value = task
+        try:
+            writer.send((True, func(value)))
+        except Exception as err:
+            writer.send((False, err))
+
+
+class _ProcessExecutor(object):
+    """
+    A pool of child processes, each fed by a greenlet.
+
+    multiprocessing.Pool relies on background threads which do not cooperate
+    with gevent monkey-patching, so tasks are sent over one-way pipes instead
+    (duplex pipes are sockets, which become non-blocking when patched), and
+    the greenlets wait for results using the hub.
+    """
+    def __init__(self, workers):
+        import multiprocessing
+        import gevent.queue
+        self.tasks = gevent.queue.Queue()
+        self.processes = []
+        self.feeders = []
+        for _ in range(workers):
+            task_reader, task_writer = multiprocessing.Pipe(duplex=False)
+            result_reader, result_writer = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=_process_worker, args=(task_reader, result_writer))
+            process.daemon = True
+            process.start()
+            self.processes.append((process, task_writer, result_reader))
+            self.feeders.append(
+                gevent.spawn(self._feed, task_writer, result_reader))
+
+    def _feed(self, writer, reader):
+        from gevent.socket import wait_read
+        while True:
+            func, value, result = self.tasks.get()
+            writer.send((func, value))
+            wait_read(reader.fileno())
+            ok, output = reader.recv()
+            if ok:
+                result.set(output)
+            else:
+                result.set_exception(output)
+
+    def submit(self, func, value):
+        import gevent.event
+        result = gevent.event.AsyncResult()
+        self.tasks.put((func, value, result))
+        return result
+
+    def shutdown(self):
+        gevent.killall(self.feeders)
+        for process, writer, reader in self.processes:
+            try:
+                writer.send(None)
+            except (IOError, OSError):
+                pass
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+            writer.close()
+            reader.close()
+
+
+class _InputWakeup(object):
+    """
+    An event which is set when packets arrive at a port or it is drained, so
+    that input can be waited for together with results.
+    """
+    def __init__(self, port):
+        self.event = gevent.event.Event()
+        port.add_watcher(self)
+
+    def backlog_changed(self, connection):
+        self.event.set()
+
+
+EXECUTORS = {
+    'greenlet': _GreenletExecutor,
+    'thread': _ThreadExecutor,
+    'process': _ProcessExecutor,
+}
+
+
+@component
+@inport("IN", description="Packets to be processed")
+@inport("FUNC", description="Function to apply to each packet's contents",
+        required=True)
+@inport("WORKERS", description="Number of workers", type=int, default=4)
+@inport("MODE", description="Kind of worker pool: greenlet, thread or "
+                            "process", type=str, default='thread')
+@inport("BUFFER", description="Maximum number of packets in flight. "
+                              "Defaults to twice the number of workers",
+        type=int)
+@inport("ORDERED", description="Send results in input order. If False, "
+                               "results are sent as soon as they are ready",
+        type=bool, default=True)
+@outport("OUT", description="Results of FUNC")
+def ParallelMap(IN, FUNC, WORKERS, MODE, BUFFER, ORDERED, OUT):
+    """
+    Apply FUNC to the contents of each packet using a pool of workers
+
+    Results are sent as soon as they are ready, while waiting for further
+    input. In ordered mode, results wait in a reorder buffer until all earlier
+    results have been sent. At most BUFFER packets are in flight at once, so
+    memory is bounded even when one item is slow. In process mode FUNC and
+    the packet contents must be picklable.
+    """
+    func = FUNC.receive_once()
+    workers = max(WORKERS.receive_once(), 1)
+    mode = MODE.receive_once()
+    buffer_size = BUFFER.receive_once() or workers * 2
+    ordered = ORDERED.receive_once()
+    if func is None:
+        return
+
+    try:
+        executor = EXECUTORS[mode](workers)
+    except KeyError:
+        raise FlowError("Unknown mode {!r}. Choose from: {}".format(
+            mode, ', '.join(sorted(EXECUTORS))))
+
+    # (source packet, result) pairs. the attrs of the source packet, such as
+    # a request id, are copied to the packet sent for its result
+    pending = deque()
+    wakeup = _InputWakeup(IN)
+
+    def send(source, result):
+        OUT.send(OUT.component.create(result.get(), source=source))
+
+    def send_ready(block):
+        """
+        Send completed results. If `block` is True, wait for at least one.
+        """
+        if ordered:
+            while pending and (block or pending[0][1].ready()):
+                send(*pending.popleft())
+                block = False
+        else:
+            if block:
+                gevent.wait([result for _, result in pending], count=1)
+            for item in [item for item in pending if item[1].ready()]:
+                pending.remove(item)
+                send(*item)
+
+    try:
+        while not OUT.is_closed():
+            send_ready(block=len(pending) >= buffer_size)
+            wakeup.event.clear()
+            if pending and IN.is_empty() and not IN.is_drained():
+                # wait for input and results together, so that results are
+                # sent as soon as they are ready
+                waiting = [pending[0]] if ordered else pending
+                gevent.wait([result for _, result in waiting] +
+                            [wakeup.event], count=1)
+                continue
+            packet = IN.receive()
+            if packet is None:
+                break
+            value = IN.validate_packet_contents(IN.component.drop(packet))
+            pending.append((packet, executor.submit(func, value)))
+        while pending and not OUT.is_closed():
+            send_ready(block=True)
+    finally:
+        executor.shutdown()
@@ -1,5 +1,10 @@
+import numbers
+import zlib
+
 from rill import *
+from rill.engine.exceptions import FlowError
 from rill.fn import zip, cycle, load_balanced, forked
+from rill.compat import *
 
 
 # TODO: add ability to control number of packets sent to each
@@ -42,16 +47,20 @@ def Replicate(IN, OUT):
         p.drop()
 
 
+@component
 @outport("OUT", array=True, description="Packets being output")
 @inport("IN", description="Incoming packets")
-def LoadBalance(IN, OUT):
+@inport("CHOICES", type=int,
+        description="If set, pick the least loaded of this many randomly "
+                    "sampled elements, rather than of all elements")
+def LoadBalance(IN, CHOICES, OUT):
     """
     Sends incoming packets to output array element with smallest backlog
     """
 
     active_outport = None
     substream_level = 0
-    outports = load_balanced(OUT)
+    outports = load_balanced(OUT, choices=CHOICES.receive_once())
     for p in IN.iter_packets():
         if substream_level == 0:
             # find output port with the least number of downstream packets
@@ -61,3 +70,88 @@ def LoadBalance(IN, OUT):
         elif p.get_type() == Packet.Type.CLOSE:
             substream_level -= 1
         active_outport.send(p)
+
+
+def _stable_hash(key):
+    """
+    Hash `key` the same way in every process.
+
+    ``hash()`` of strings is randomized per process (see ``PYTHONHASHSEED``),
+    so strings, and other keys except integers, are hashed by the crc32 of
+    their utf-8 encoding or of their repr.
+
+    Returns
+    -------
+    int
+    """
+    if isinstance(key, numbers.Integral):
+        return int(key)
+    elif isinstance(key, bytes):
+        data = key
+    elif isinstance(key, str):
+        data = key.encode('utf-8')
+    else:
+        data = repr(key).encode('utf-8')
+    return zlib.crc32(data) & 0xffffffff
+
+
+@component
+@outport("OUT", array=True, description="Partitioned packets")
+@outport("ROUTE", type=int,
+         description="Index of the OUT element each packet or substream was "
+                     "sent to, for use with OrderedMerge")
+@inport("IN", description="Incoming packets")
+@inport("KEY", required=True,
+        description="Function used to extract a partitioning key from each "
+                    "packet's contents")
+def PartitionByKey(IN, KEY, OUT, ROUTE):
+    """
+    Sends incoming packets to output array element ``hash(KEY(p)) % n``
+
+    All packets with the same key are sent to the same element, in order.
+    The hash of a key is the same in every process, so separate networks
+    partition alike. Substreams are kept together and routed according to the
+    key of their first data packet. Empty substreams are sent to the first
+    element.
+    """
+    outports = OUT.ports()
+    if not outports:
+        raise FlowError("OUT has no elements to partition to")
+    key = KEY.receive_once()
+
+    def partition(content):
+        return outports[_stable_hash(key(content)) % len(outports)]
+
+    def route(outport):
+        if ROUTE.is_connected():
+            ROUTE.send(outport.index)
+
+    active_outport = None
+    # brackets received before the first data packet of a substream
+    pending = []
+    substream_level = 0
+    for p in IN.iter_packets():
+        if p.get_type() == Packet.Type.OPEN:
+            substream_level += 1
+            if active_outport is None:
+                pending.append(p)
+                continue
+        elif p.get_type() == Packet.Type.CLOSE:
+            substream_level -= 1
+            if active_outport is None:
+                if substream_level != 0:
+                    pending.append(p)
+                    continue
+                # an empty substream: there is no key to partition on, so
+                # it goes to the first element
+                active_outport = outports[0]
+        elif active_outport is None:
+            active_outport = partition(p.get_contents())
+
+        for bracket in pending:
+            active_outport.send(bracket)
+        del pending[:]
+        active_outport.send(p)
+        if substream_level == 0:
+            route(active_outport)
+            active_outport = None
@@ -1,7 +1,34 @@
 
 import time
+from collections import deque
+
 from rill import *
 
+# returned by _receive when no packet arrived in time
+_TIMEOUT = object()
+
+
+def _receive(port, timeout=None):
+    """
+    Receive from `port`, giving up after `timeout` seconds.
+
+    Returns
+    -------
+    Union[``rill.engine.packet.Packet``, None, object]
+        the packet, None at end of stream, or `_TIMEOUT`
+    """
+    p = port.receive(timeout)
+    if p is None and timeout is not None and not port.is_drained():
+        return _TIMEOUT
+    return p
+
+
+def _next_boundary(timestamp, size):
+    """
+    Get the first multiple of `size` after `timestamp`.
+    """
+    return (timestamp // size + 1) * size
+
 
 @component
 @outport("OUT")
@@ -63,3 +90,171 @@ def Gate(IN, TRIGGER, OUT):
     # pass output
     OUT.send(rp.get_contents())
     rp.drop()
+
+
+@component
+@outport("OUT", description="Batches of packet contents", type=list)
+@inport("IN")
+@inport("SIZE", description="Length of each window in seconds", type=float)
+@inport("COUNT", description="Maximum number of packets in each window",
+        type=int)
+@inport("TIMESTAMP", description="Function used to extract a timestamp from "
+                                 "each packet's contents. If not set, the "
+                                 "arrival time is used")
+def TumblingWindow(IN, SIZE, COUNT, TIMESTAMP, OUT):
+    """
+    Batch packets into consecutive, non-overlapping windows
+
+    Windows are aligned to multiples of SIZE seconds and closed early once
+    they hold COUNT packets. When using arrival time, a window is sent as soon
+    as its end is reached, even if no further packets arrive.
+    """
+    size = SIZE.receive_once()
+    count = COUNT.receive_once()
+    get_timestamp = TIMESTAMP.receive_once()
+    if not size and not count:
+        return
+
+    window = []
+    end = None
+    while True:
+        timeout = None
+        if get_timestamp is None and end is not None:
+            timeout = end - time.time()
+        p = _receive(IN, timeout)
+        if p is None:
+            break
+        if p is _TIMEOUT:
+            OUT.send(window)
+            window = []
+            end = None
+            continue
+
+        content = p.drop()
+        timestamp = time.time() if get_timestamp is None else \
+            get_timestamp(content)
+        if end is not None and timestamp >= end:
+            OUT.send(window)
+            window = []
+            end = None
+        if end is None and size:
+            end = _next_boundary(timestamp, size)
+        window.append(content)
+        if count and len(window) >= count:
+            OUT.send(window)
+            window = []
+            end = None
+
+    if window:
+        OUT.send(window)
+
+
+@component
+@outport("OUT", description="Batches of packet contents", type=list)
+@inport("IN")
+@inport("SIZE", description="Length of each window in seconds", type=float,
+        required=True)
+@inport("SLIDE", description="Seconds between the start of each window",
+        type=float, required=True)
+@inport("TIMESTAMP", description="Function used to extract a timestamp from "
+                                 "each packet's contents. If not set, the "
+                                 "arrival time is used")
+def SlidingWindow(IN, SIZE, SLIDE, TIMESTAMP, OUT):
+    """
+    Batch packets into overlapping windows of SIZE seconds, starting every
+    SLIDE seconds
+
+    Only non-empty windows are sent. Packets are held only as long as they
+    belong to a window which has not been sent.
+    """
+    size = SIZE.receive_once()
+    slide = SLIDE.receive_once()
+    get_timestamp = TIMESTAMP.receive_once()
+    if not size or not slide:
+        return
+
+    # (timestamp, content) pairs, oldest first
+    items = deque()
+    end = None
+    while True:
+        timeout = None
+        if get_timestamp is None and end is not None:
+            timeout = end - time.time()
+        p = _receive(IN, timeout)
+        if p is None:
+            break
+        if p is _TIMEOUT:
+            timestamp = end
+        else:
+            content = p.drop()
+            timestamp = time.time() if get_timestamp is None else \
+                get_timestamp(content)
+
+        # send every window that ends before this timestamp
+        while end is not None and end <= timestamp:
+            batch = [c for t, c in items if t >= end - size]
+            if batch:
+                OUT.send(batch)
+            end += slide
+            while items and items[0][0] < end - size:
+                items.popleft()
+            if not items:
+                end = None
+
+        if p is not _TIMEOUT:
+            items.append((timestamp, content))
+            if end is None:
+                end = _next_boundary(timestamp, slide)
+
+    while items:
+        batch = [c for t, c in items if t >= end - size]
+        if batch:
+            OUT.send(batch)
+        end += slide
+        while items and items[0][0] < end - size:
+            items.popleft()
+
+
+@component
+@outport("OUT", description="Batches of packet contents", type=list)
+@inport("IN")
+@inport("GAP", description="Seconds of inactivity which close a session",
+        type=float, required=True)
+@inport("TIMESTAMP", description="Function used to extract a timestamp from "
+                                 "each packet's contents. If not set, the "
+                                 "arrival time is used")
+def SessionWindow(IN, GAP, TIMESTAMP, OUT):
+    """
+    Batch packets into sessions separated by more than GAP seconds
+    """
+    gap = GAP.receive_once()
+    get_timestamp = TIMESTAMP.receive_once()
+    if gap is None:
+        return
+
+    window = []
+    last = None
+    while True:
+        timeout = None
+        if get_timestamp is None and last is not None:
+            timeout = last + gap - time.time()
+        p = _receive(IN, timeout)
+        if p is None:
+            break
+        if p is _TIMEOUT:
+            OUT.send(window)
+            window = []
+            last = None
+            continue
+
+        content = p.drop()
+        timestamp = time.time() if get_timestamp is None else \
+            get_timestamp(content)
+        if last is not None and timestamp - last > gap:
+            OUT.send(window)
+            window = []
+        window.append(content)
+        last = timestamp
+
+    if window:
+        OUT.send(window)
@@ -45,14 +45,27 @@ ANNOTATIONS = (
 )
 
 
+def _is_coroutine_function(func):
+    import inspect
+    return getattr(inspect, 'iscoroutinefunction', lambda f: False)(func)
+
+
 def component(name_or_func=None, **kwargs):
     """
     Decorator to create a component from a function.
+
+    The function may also be an ``async def`` function (python 3.5+), in which
+    case its port operations must be awaited. See ``rill.engine.aio``.
     """
-    from rill.engine.component import _FunctionComponent
+    from rill.engine.component import (_FunctionComponent,
+                                       _AsyncFunctionComponent)
 
     def decorator(func):
         name_ = name or func.__name__
+        if _is_coroutine_function(func):
+            default_base = _AsyncFunctionComponent
+        else:
+            default_base = _FunctionComponent
         attrs = {
             'type_name': name_,
             '_pass_context': kwargs.get('pass_context', False),
@@ -61,7 +74,7 @@ def component(name_or_func=None, **kwargs):
             '__module__': func.__module__,
         }
         cls = type(name_,
-                   (kwargs.get('base_class', _FunctionComponent),),
+                   (kwargs.get('base_class', default_base),),
                    attrs)
         # transfer annotations from func to cls
         for ann in ANNOTATIONS:
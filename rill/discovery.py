@@ -0,0 +1,123 @@
+"""
+Persistent cache of component specs, so that a runtime can list the
+components of a module without importing it.
+"""
+import os
+import json
+import logging
+import inspect
+
+import rill
+from rill.utils import importable_class_name
+from rill.compat import *
+
+logger = logging.getLogger(__name__)
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class ComponentCache(object):
+    """
+    Component specs, keyed by module name and stored as json.
+
+    An entry is valid for as long as the module's file, and the files that
+    defined its components, keep their modification times. The whole cache is
+    discarded when rill's version changes.
+    """
+    default_path = os.path.join('~', '.cache', 'rill', 'components.json')
+
+    def __init__(self, path=None):
+        """
+        Parameters
+        ----------
+        path : Optional[str]
+            location of the cache file. Defaults to the
+            ``RILL_COMPONENT_CACHE`` environment variable, or
+            `ComponentCache.default_path`
+        """
+        path = path or os.environ.get('RILL_COMPONENT_CACHE',
+                                      self.default_path)
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self._data = self._load()
+
+    def _load(self):
+        empty = {'version': rill.__version__, 'modules': {}}
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return empty
+        if data.get('version') != rill.__version__:
+            return empty
+        return data
+
+    def save(self):
+        """
+        Write the cache to disk.
+        """
+        dirname = os.path.dirname(self.path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        # write and rename, so that concurrent runtimes never read a partial
+        # file
+        tmp = '{}.{}'.format(self.path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(self._data, f)
+        os.rename(tmp, self.path)
+
+    def get_module(self, modname):
+        """
+        Get the cached components of a module.
+
+        Parameters
+        ----------
+        modname : str
+
+        Returns
+        -------
+        Optional[List[Dict[str, Any]]]
+            dicts with the importable ``class`` name and the ``spec`` of each
+            component, or None if the module is not cached or has changed
+        """
+        entry = self._data['modules'].get(modname)
+        if entry is None:
+            return None
+        for path, mtime in entry['files'].items():
+            if _mtime(path) != mtime:
+                return None
+        return entry['components']
+
+    def set_module(self, module, component_classes):
+        """
+        Store the components of an imported module.
+
+        Parameters
+        ----------
+        module : ModuleType
+        component_classes : List[Type[``rill.engine.component.Component``]]
+        """
+        files = set()
+        for obj in [module] + list(component_classes):
+            try:
+                files.add(os.path.abspath(inspect.getsourcefile(obj)))
+            except TypeError:
+                # builtin, or defined dynamically
+                pass
+        components = [
+            {'class': importable_class_name(cls), 'spec': cls.get_spec()}
+            for cls in component_classes]
+        try:
+            json.dumps(components)
+        except (TypeError, ValueError):
+            logger.debug("Not caching {}: its specs are not "
+                         "serializable".format(module.__name__))
+            return
+        self._data['modules'][module.__name__] = {
+            'files': {path: _mtime(path) for path in files},
+            'components': components
+        }
@@ -0,0 +1,182 @@
+"""
+asyncio integration (python 3.5+).
+
+The engine itself runs on gevent. This module bridges the two worlds:
+
+- components may be written as ``async def`` functions. They run within their
+  runner's greenlet, and their ports are wrapped so that port operations can
+  be awaited. Awaiting a port operation blocks the greenlet exactly as it
+  would in a regular component, so no event loop is involved. For the same
+  reason async components cannot await asyncio futures, tasks or other
+  asyncio coroutines such as ``asyncio.sleep(n)``: only port operations,
+  `sleep` and bare yields (``asyncio.sleep(0)``) are supported, and anything
+  else raises ``FlowError``. Use gevent-friendly blocking calls instead.
+- `run_graph_async` runs a graph from within an asyncio event loop, on a
+  worker thread with its own gevent hub. The engine's runners only wait on
+  gevent primitives, so the service embedding it does not need to be
+  monkey-patched. Components which make blocking stdlib calls will, however,
+  block the worker thread's hub until those calls return.
+"""
+import asyncio
+
+import gevent
+
+from rill.engine.exceptions import FlowError
+from rill.engine.inputport import InputArray
+from rill.engine.outputport import OutputArray
+from rill.engine.port import BasePort
+
+
+async def sleep(seconds=0):
+    """
+    Suspend the current component for `seconds`.
+
+    Use this instead of ``asyncio.sleep`` within async components.
+    """
+    gevent.sleep(seconds)
+
+
+class _AsyncIterator(object):
+    """
+    Adapts a blocking iterator to the asynchronous iterator protocol.
+    """
+    def __init__(self, iterator):
+        self._iterator = iterator
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class AsyncPort(object):
+    """
+    Wraps a port so that its blocking operations can be awaited.
+
+    Attributes not overridden here are looked up on the wrapped port.
+    """
+    def __init__(self, port):
+        self.port = port
+
+    def __getattr__(self, name):
+        return getattr(self.port, name)
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.port)
+
+
+class AsyncInputPort(AsyncPort):
+    async def receive(self, timeout=None):
+        return self.port.receive(timeout)
+
+    async def receive_once(self, default=None):
+        return self.port.receive_once(default)
+
+    def iter_packets(self):
+        return _AsyncIterator(self.port.iter_packets())
+
+    def iter_contents(self):
+        return _AsyncIterator(self.port.iter_contents())
+
+    __aiter__ = iter_packets
+
+
+class AsyncOutputPort(AsyncPort):
+    async def send(self, packet):
+        return self.port.send(packet)
+
+
+class AsyncArrayPort(AsyncPort):
+    def __iter__(self):
+        for port in self.port:
+            yield wrap_port(port)
+
+    def __getitem__(self, index):
+        return wrap_port(self.port[index])
+
+    def get_element(self, index=None, create=False):
+        return wrap_port(self.port.get_element(index, create))
+
+
+def wrap_port(port):
+    """
+    Wrap `port` so that its blocking operations can be awaited.
+
+    Parameters
+    ----------
+    port : Union[``rill.engine.port.BasePort``, Any]
+
+    Returns
+    -------
+    Union[``AsyncPort``, Any]
+        objects which are not ports are returned unchanged
+    """
+    if isinstance(port, (InputArray, OutputArray)):
+        return AsyncArrayPort(port)
+    elif isinstance(port, BasePort):
+        if port.kind == 'in':
+            return AsyncInputPort(port)
+        return AsyncOutputPort(port)
+    return port
+
+
+def run_coroutine(coro):
+    """
+    Run `coro` to completion within the current greenlet.
+
+    `coro` may only await port operations, `sleep` and bare yields: awaiting
+    anything which needs an asyncio event loop raises ``FlowError``.
+
+    Parameters
+    ----------
+    coro : Coroutine
+
+    Returns
+    -------
+    Any
+        the coroutine's result
+    """
+    while True:
+        try:
+            yielded = coro.send(None)
+        except StopIteration as e:
+            return e.value
+        if yielded is not None:
+            coro.close()
+            raise FlowError(
+                "Async components may only await port operations and "
+                "rill.engine.aio.sleep(), not {!r}".format(yielded))
+        # a bare yield, as done by asyncio.sleep(0)
+        gevent.sleep(0)
+
+
+def run_graph_async(graph, initializations=None, capture_results=False,
+                    loop=None, executor=None):
+    """
+    Run a graph from an asyncio event loop.
+
+    The network runs on a worker thread, with its own gevent hub, and the
+    returned future completes when it finishes. Since the graph is run in
+    place, a run which overlaps another run of the same graph on a different
+    thread fails with ``FlowError``. See ``rill.engine.network.run_graph``
+    for the other parameters.
+
+    Parameters
+    ----------
+    loop : Optional[asyncio.AbstractEventLoop]
+        defaults to the current event loop
+    executor : Optional[concurrent.futures.Executor]
+        defaults to the loop's default executor
+
+    Returns
+    -------
+    asyncio.Future
+    """
+    from rill.engine.network import run_graph
+    loop = loop or asyncio.get_event_loop()
+    return loop.run_in_executor(executor, run_graph, graph, initializations,
+                                capture_results)
@@ -166,15 +166,40 @@ class Component(object):
         name = cls.type_name or cls.__name__
         return '{0}/{1}'.format(cls.__module__, name)
 
+    @classmethod
+    def _spec_key(cls):
+        """
+        Value which changes whenever the result of `get_spec` may change.
+
+        Returns
+        -------
+        tuple
+        """
+        return (tuple(inport.get_inherited(cls)),
+                tuple(outport.get_inherited(cls)))
+
     @classmethod
     def get_spec(cls):
         """
         Get a fbp-protocol-compatible component spec
 
+        The spec is computed once per class, and again only if its ports
+        change. The result is shared, so it must not be modified.
+
         Returns
         -------
         dict
         """
+        key = cls._spec_key()
+        # look in the class's own namespace: subclasses have their own spec
+        cached = cls.__dict__.get('_spec_cache')
+        if cached is None or cached[0] != key:
+            cached = (key, cls._make_spec())
+            cls._spec_cache = cached
+        return cached[1]
+
+    @classmethod
+    def _make_spec(cls):
         import textwrap
         from rill.engine.subnet import SubGraph
 
@@ -321,13 +346,16 @@ class Component(object):
                 "Packet not owned by current component, "
                 "or component has terminated (owner is %s)" % packet.owner)
 
-    def create(self, contents):
+    def create(self, contents, source=None):
         """
         Create a Packet and set its owner to this component.
 
         Parameters
         ----------
         contents : Any
+        source : Optional[``rill.engine.packet.Packet``]
+            packet which the new packet is derived from. Its attrs are copied
+            to the new packet
 
         Returns
         -------
@@ -341,7 +369,10 @@ class Component(object):
             contents = ""
         else:
             type = Packet.Type.NORMAL
-        return Packet(contents, self, type)
+        packet = Packet(contents, self, type)
+        if source is not None and source.attrs:
+            packet.attrs.update(source.attrs)
+        return packet
 
     def drop(self, packet):
         """
@@ -548,3 +579,18 @@ class _FunctionComponent(Component):
 
     def execute(self):
         self._execute(*self.get_args())
+
+
+class _AsyncFunctionComponent(_FunctionComponent):
+    """
+    Base class for components created from ``async def`` functions via
+    ``rill.decorators.component``
+
+    Ports are passed wrapped so that their operations can be awaited. See
+    ``rill.engine.aio``.
+    """
+
+    def execute(self):
+        from rill.engine.aio import run_coroutine, wrap_port
+        args = [wrap_port(arg) for arg in self.get_args()]
+        run_coroutine(self._execute(*args))
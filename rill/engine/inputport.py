@@ -1,5 +1,7 @@
 from abc import ABCMeta, abstractmethod
 from collections import deque
+import time
+import weakref
 
 from typing import Any, Union, Iterable, Tuple
 
@@ -13,7 +15,6 @@ from rill.compat import *
 
 import gevent
 import gevent.event
-import gevent.pool
 
 
 @add_metaclass(ABCMeta)
@@ -170,9 +171,23 @@ class InputPort(Port, InputInterface):
     def is_null(self):
         return self.name == IN_NULL
 
-    def receive(self):
+    def receive(self, timeout=None):
+        """
+        Receive the next available packet.
+
+        Parameters
+        ----------
+        timeout : Optional[float]
+            seconds to wait for a packet. None waits indefinitely
+
+        Returns
+        -------
+        packet : Union[``rill.engine.packet.Packet``, None]
+            next available packet. None at the end of input, or when
+            `timeout` expires first: use `is_drained` to tell them apart
+        """
         if self.is_connected():
-            p = self._connection.receive()
+            p = self._connection.receive(timeout)
             if p is not None:
                 return p
 
@@ -229,6 +244,22 @@ class InputPort(Port, InputInterface):
         self._connection = None
         return conn
 
+    def add_watcher(self, watcher):
+        """
+        Notify `watcher` when the backlog of this port's connection changes or
+        the connection is drained.
+
+        Initialized and unconnected ports never notify.
+
+        Parameters
+        ----------
+        watcher : Any
+            object with a ``backlog_changed(connection)`` method. It is held
+            by weak reference
+        """
+        if isinstance(self._connection, Connection):
+            self._connection.watchers.append(weakref.ref(watcher))
+
     def upstream_count(self):
         """
         Get the upstream packet count.
@@ -242,11 +273,17 @@ class InputPort(Port, InputInterface):
         else:
             return 0
 
+    def is_empty(self):
+        """
+        Returns True if there are no packets waiting on the connection.
+        """
+        return self.upstream_count() == 0
+
     def is_drained(self):
         """
         Returns True if the connection is drained (closed and empty).
         """
-        return self.is_closed() and self.upstream_count() == 0
+        return self.is_closed() and self.is_empty()
 
 
 @add_metaclass(ABCMeta)
@@ -273,7 +310,7 @@ class BaseConnection(object):
         return self.outport.component._runner
 
     @abstractmethod
-    def receive(self):
+    def receive(self, timeout=None):
         raise NotImplementedError
 
     @abstractmethod
@@ -344,7 +381,7 @@ class InitializationConnection(BaseConnection):
     def is_empty(self):
         return self._is_closed
 
-    def receive(self):
+    def receive(self, timeout=None):
         """
         On the first call, returns a packet owned by the receiving component.
 
@@ -399,6 +436,10 @@ class Connection(BaseConnection):
         self.drop_oldest = False
         self.count_packets = False
         self.metadata = {}
+        # weak references to objects whose `backlog_changed(connection)`
+        # method is called whenever the number of queued packets changes or
+        # the connection is drained
+        self.watchers = []
 
     def __repr__(self):
         return '%s(%r)' % (self.__class__.__name__,
@@ -406,7 +447,7 @@ class Connection(BaseConnection):
 
     def __getstate__(self):
         data = self.__dict__.copy()
-        for k in ('_not_empty', '_not_full'):
+        for k in ('_not_empty', '_not_full', 'watchers'):
             data.pop(k)
         return data
 
@@ -415,10 +456,19 @@ class Connection(BaseConnection):
             self.__dict__[key] = value
         self._not_empty = gevent.event.Event()
         self._not_full = gevent.event.Event()
+        self.watchers = []
 
     def count(self):
         return len(self._queue)
 
+    def _notify_watchers(self):
+        for ref in list(self.watchers):
+            watcher = ref()
+            if watcher is None:
+                self.watchers.remove(ref)
+            else:
+                watcher.backlog_changed(self)
+
     def open(self):
         pass
 
@@ -447,6 +497,9 @@ class Connection(BaseConnection):
         self._not_empty.set()
         self._not_full.set()
 
+        if self.watchers:
+            self._notify_watchers()
+
     def indicate_sender_closed(self):
         """
         Indicate one sending Component closed
@@ -466,6 +519,8 @@ class Connection(BaseConnection):
                             # release any senders waiting for slots.
                             # they will check for a closed state and exit
                             self._not_empty.set()
+                        if self.watchers:
+                            self._notify_watchers()
 
         finally:
             self.receiver.trace_locks("sender closed - unlock",
@@ -529,9 +584,9 @@ class Connection(BaseConnection):
         """
         return self.count() == self.capacity()
 
-    def receive(self):
+    def receive(self, timeout=None):
         """
-        See ``InputInterface.receive``.
+        See ``InputPort.receive``.
         """
         self.receiver.logger.debug("Receiving", port=self.inport)
 
@@ -541,13 +596,28 @@ class Connection(BaseConnection):
                                        port=self.inport)
             return None
 
+        # yield, if the budget is used up, before a packet is taken: once it
+        # is dequeued nothing may come between the packet and the component
+        if self.receiver._yield_enabled:
+            self.receiver.count_operation()
+
+        if timeout is not None:
+            deadline = time.time() + timeout
+
         self.receiver.network.receives += 1
         while self.is_empty():
+            if timeout is not None:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    self.receiver.logger.debug("Receive timed out",
+                                               port=self.inport)
+                    return None
+
             self.receiver.status = StatusValues.SUSP_RECV
             self.receiver.curr_conn = self
             self.receiver.logger.debug("Receive suspended", port=self.inport)
 
-            self._not_empty.wait()
+            self._not_empty.wait(timeout)
 
             if self.receiver.is_terminated() or self.receiver.has_error():
                 return None
@@ -581,6 +651,9 @@ class Connection(BaseConnection):
         self._not_full.set()
         self._not_full.clear()
 
+        if self.watchers:
+            self._notify_watchers()
+
         packet.set_owner(self.receiver.component)
 
         if packet.get_contents() is None:
@@ -660,6 +733,8 @@ class Connection(BaseConnection):
             with self.receiver._lock:
                 packet.clear_owner()
                 self._queue.append(packet)
+                if self.watchers:
+                    self._notify_watchers()
                 if self.receiver.status in [
                     StatusValues.DORMANT,
                     StatusValues.NOT_STARTED,
@@ -684,7 +759,10 @@ class Connection(BaseConnection):
             self.sender.trace_locks("send - unlock", port=outport)
 
         self.sender.network.sends += 1
+        sender = self.sender
         self.outport = None
+        if sender._yield_enabled:
+            sender.count_operation()
         return True
 
     def capacity(self):
@@ -725,12 +803,108 @@ class BaseInputCollection(BasePortCollection, InputInterface):
 #         return self.iter_ports()
 
 
-class EagerInputCollection(BaseInputCollection):
+class _WatchingInputCollection(BaseInputCollection):
+    """
+    Base class for input collections which are notified by their ports'
+    connections when packets arrive or the connections are drained, rather
+    than polling every port.
+    """
+
+    def __init__(self, component, ports):
+        """
+        Parameters
+        ----------
+        component : ``rill.engine.component.Component``
+        ports : Iterable[``BasePort``]
+        """
+        super(_WatchingInputCollection, self).__init__(component, ports)
+        # ports whose connections notify us of changes
+        # type: Dict[Connection, InputPort]
+        self._watched = {}
+        # initialized or unconnected ports, which are checked directly
+        self._unwatched = []
+        self._wakeup = gevent.event.Event()
+
+        ref = weakref.ref(self)
+        for port in self.iter_ports():
+            connection = port._connection
+            if isinstance(connection, Connection):
+                self._watched[connection] = port
+                connection.watchers.append(ref)
+            else:
+                self._unwatched.append(port)
+
+    def backlog_changed(self, connection):
+        """
+        Called by a watched connection when its packet count changes or it is
+        drained.
+
+        Parameters
+        ----------
+        connection : ``Connection``
+        """
+        self._wakeup.set()
+
+    def _wait(self, status):
+        """
+        Suspend until a watched connection changes.
+
+        Parameters
+        ----------
+        status : str
+            status of the receiver while suspended
+        """
+        self._wakeup.clear()
+        self.receiver.status = status
+        try:
+            self._wakeup.wait()
+        finally:
+            self.receiver.status = StatusValues.ACTIVE
+
+
+class EagerInputCollection(_WatchingInputCollection):
     """
     Provides methods for receiving from the first ready port within the
     collection.
+
+    Connections notify the collection when they receive packets, and ports
+    are queued in the order they became ready, so finding a port with data is
+    O(1) and fair across ports.
     """
 
+    def __init__(self, component, ports):
+        """
+        Parameters
+        ----------
+        component : ``rill.engine.component.Component``
+        ports : Iterable[``BasePort``]
+        """
+        super(EagerInputCollection, self).__init__(component, ports)
+        # ports which may have data, in the order they became ready
+        self._ready = deque()
+        self._queued = set()
+        self._undrained = set()
+        for connection, port in self._watched.items():
+            if not connection.is_drained():
+                self._undrained.add(port)
+        for port in self.iter_ports():
+            if port in self._undrained and not port.is_empty():
+                self._push(port)
+
+    def _push(self, port):
+        if port not in self._queued:
+            self._queued.add(port)
+            self._ready.append(port)
+
+    def backlog_changed(self, connection):
+        port = self._watched[connection]
+        if not connection.is_empty():
+            self._push(port)
+            self._wakeup.set()
+        elif connection.is_drained():
+            self._undrained.discard(port)
+            self._wakeup.set()
+
     def next_port(self):
         """
         Find the first port that has data.
@@ -743,33 +917,33 @@ class EagerInputCollection(BaseInputCollection):
         """
         self.receiver.trace_funcs("Starting next_port")
         while True:
-            all_drained = True
-            for port in self.ports():
-                # if port.is_closed():
-                #   continue
-                #
+            for port in self._unwatched:
                 if not port.is_empty():
                     self.receiver.trace_funcs(
                         "Ending next_port - returned: {}".format(port))
                     return port
-                elif not port.is_drained():
-                    all_drained = False
-            if all_drained:
+
+            while self._ready:
+                port = self._ready.popleft()
+                if port.is_empty():
+                    self._queued.discard(port)
+                else:
+                    # move to the back of the queue so that other ready ports
+                    # get their turn
+                    self._ready.append(port)
+                    self.receiver.trace_funcs(
+                        "Ending next_port - returned: {}".format(port))
+                    return port
+
+            if not self._undrained and \
+                    all(port.is_drained() for port in self._unwatched):
                 self.receiver.trace_funcs(
                     "Ending next_port - all drained")
                 return None
-            else:
-                self.receiver.trace_locks("gpwd - lock ")
-                try:
-                    with self.receiver._lock:
-                        self.receiver.status = StatusValues.SUSP_FIPE
-                        self.receiver.trace_funcs("find IPE with data")
-                        self.receiver.trace_locks("fipewd - await")
-                        self.receiver._can_go.wait()
-                finally:
-                    self.receiver.trace_locks("gpwd - unlock ")
-                    self.receiver.status = StatusValues.ACTIVE
-                    self.receiver.trace_funcs("Active")
+
+            self.receiver.trace_funcs("find IPE with data")
+            self._wait(StatusValues.SUSP_FIPE)
+            self.receiver.trace_funcs("Active")
 
     def receive(self):
         """
@@ -784,24 +958,46 @@ class EagerInputCollection(BaseInputCollection):
             return port.receive()
 
 
-class SynchronizedInputCollection(BaseInputCollection):
+class SynchronizedInputCollection(_WatchingInputCollection):
     """
     Provides methods for synchronizing the receipt of packets from a collection
     of ports.
+
+    Packets are received from each port as soon as it is ready, in any order,
+    without spawning a greenlet per port.
     """
 
+    def __init__(self, component, ports):
+        """
+        Parameters
+        ----------
+        component : ``rill.engine.component.Component``
+        ports : Iterable[``BasePort``]
+        """
+        super(SynchronizedInputCollection, self).__init__(component, ports)
+        self._port_list = self.ports()
+        static = [p for p in self._port_list if p.is_initialized()]
+        if len(static) == len(self._port_list):
+            # return no ports if all static to avoid infinite loop in receive
+            static = []
+        self._static_ports = static
+        # packets of a tuple whose receipt was interrupted
+        self._partial = None
+
     def is_initialized(self):
         return all(p.is_initialized() for p in self.ports())
 
-    # FIXME: cache this
     def static_ports(self):
-        ports = self.ports()
-        static = [p for p in ports if p.is_initialized()]
-        if len(static) != len(ports):
-            return static
-        else:
-            # return no ports if all static to avoid infinite loop in receive
-            return []
+        return self._static_ports
+
+    def _is_ready(self, port):
+        """
+        Whether receiving from `port` would return without suspending.
+        """
+        connection = port._connection
+        if connection not in self._watched:
+            return True
+        return not connection.is_empty() or connection.is_drained()
 
     def receive(self):
         """
@@ -813,37 +1009,71 @@ class SynchronizedInputCollection(BaseInputCollection):
         -------
         Tuple[``rill.engine.packet.Packet``, ...]
         """
-        if not self.ports():
+        ports = self._port_list
+        if not ports:
             return
 
-        # result = []
-        # for port in self.ports():
-        #     packet = port.receive()
-        #     if packet is None:
-        #         # FIXME: provide option to error if one port still has more data left
-        #         self.close()
-        #         for pkt in result:
-        #             pkt.drop()
-        #         return
-        #     result.append(packet)
-
-        # get results in parallel
-        group = gevent.pool.Group()
-        result = group.map(lambda x: x.receive(), self.ports())
-        valid = [p for p in result if p is not None]
-        if len(valid) != len(result):
-            self.close()
-            for p in valid:
-                p.drop()
-            return
+        result = self._partial or [None] * len(ports)
+        self._partial = None
+        pending = [i for i, p in enumerate(result) if p is None]
+        while pending:
+            waiting = []
+            for i in pending:
+                port = ports[i]
+                if not self._is_ready(port):
+                    waiting.append(i)
+                    continue
+                packet = port.receive()
+                if packet is None:
+                    # FIXME: provide option to error if one port still has
+                    # more data left
+                    self.close()
+                    for p in result:
+                        if p is not None:
+                            p.drop()
+                    return
+                result[i] = packet
+            pending = waiting
+            if pending:
+                self.receiver.curr_conn = ports[pending[0]]._connection
+                self._wait(StatusValues.SUSP_RECV)
+                if self.receiver.is_terminated() or self.receiver.has_error():
+                    # keep the packets received so far for the next call,
+                    # rather than losing them
+                    self._partial = result
+                    return
 
         # FIXME: maybe this should be configurable, or explicitly set using repeat()
         # initialization ports are treated like constants: they repeat
         # forever as long as there is a non-static port still open.
-        for port in self.static_ports():
+        for port in self._static_ports:
             port.open()
         return tuple(result)
 
+    def receive_batch(self, size):
+        """
+        Receive up to `size` synchronized tuples of packets.
+
+        Fewer tuples are returned if the ports are drained, or if the receiver
+        is terminated while waiting: the tuples received so far are still
+        returned.
+
+        Parameters
+        ----------
+        size : int
+
+        Returns
+        -------
+        List[Tuple[``rill.engine.packet.Packet``, ...]]
+        """
+        batch = []
+        while len(batch) < size:
+            group = self.receive()
+            if group is None:
+                break
+            batch.append(group)
+        return batch
+
     def iter_contents(self):
         """
         Iterate over the content of received packets.
@@ -7,11 +7,13 @@ from collections import defaultdict, OrderedDict
 from inspect import isclass
 import time
 import copy
+import re
 
 from typing import Dict, Union, Tuple, Any, Optional
 
 from rill.engine.exceptions import FlowError, NetworkDeadlock
 from rill.engine.runner import ComponentRunner
+from rill.engine.scheduler import PriorityScheduler
 from rill.engine.component import Component, logger
 from rill.engine.status import StatusValues
 from rill.engine.outputport import OutputPort, OutputArray
@@ -28,7 +30,7 @@ def merge_metadata(source_metadata, target_metadata):
     else:
         source_metadata = {}
 
-    for key, value in source_metadata.items():
+    for key, value in list(source_metadata.items()):
         if value is None:
             source_metadata.pop(key)
             target_metadata.pop(key, None)
@@ -245,11 +247,11 @@ class Graph(object):
         component = self._components.pop(name)
         for inport in component.inports:
             if inport.is_connected() and not inport.is_initialized():
-                for outport in inport._connection.outports:
-                    self.disconnect(inport, outport)
+                for outport in list(inport._connection.outports):
+                    self.disconnect(outport, inport)
         for outport in component.outports:
-            if outport.is_connected():
-                self.disconnect(outport._connection.inport, outport)
+            for connection in list(outport._connections):
+                self.disconnect(outport, connection.inport)
         # FIXME: remove references in self.inports and self.outports
         self.remove_component.event.emit(component)
 
@@ -702,19 +704,176 @@ class Graph(object):
         return graph
 
 
+def _replicate_component(graph, component, count):
+    """
+    Replace `component` within `graph` with `count` replicas, fed by a
+    ``LoadBalance`` and drained by one ``SubstreamSensitiveMerge`` per
+    output port.
+    """
+    from rill.components.split import LoadBalance
+    from rill.components.merge import SubstreamSensitiveMerge
+
+    name = component.get_name()
+    exported_in = [(n, p.name) for n, p in graph.inports.items()
+                   if p.component is component]
+    exported_out = [(n, p.name) for n, p in graph.outports.items()
+                    if p.component is component]
+
+    # map of port name to initial content
+    iips = OrderedDict()
+    # list of (port name, upstream outports, capacity)
+    inputs = []
+    for inport in component.inports:
+        if inport.is_initialized():
+            iips[inport.name] = inport._connection._content
+        elif inport.is_connected() or \
+                inport.name in [p for _, p in exported_in]:
+            if inport.is_null():
+                raise FlowError("{}: cannot replicate a component with a "
+                                "connected null port".format(component))
+            conn = inport._connection
+            inputs.append((inport.name,
+                           list(conn.outports) if conn else [],
+                           conn.capacity() if conn else None))
+    if len(inputs) > 1:
+        raise FlowError(
+            "{}: cannot replicate a component with more than one input "
+            "stream: {}".format(component, ', '.join(n for n, _, _ in inputs)))
+
+    # list of (port name, downstream inports, capacity)
+    outputs = []
+    for outport in component.outports:
+        if outport.is_connected() or \
+                outport.name in [p for _, p in exported_out]:
+            if outport.is_null():
+                raise FlowError("{}: cannot replicate a component with a "
+                                "connected null port".format(component))
+            outputs.append((outport.name,
+                            [c.inport for c in outport._connections],
+                            [c.capacity() for c in outport._connections]))
+
+    graph.remove_component(name)
+    metadata = component.metadata.copy()
+    metadata.pop('parallelism')
+
+    replicas = []
+    for i in range(count):
+        replica = graph.add_component('{}_{}'.format(name, i),
+                                      type(component))
+        replica.metadata.update(metadata)
+        for port_name, content in iips.items():
+            port = replica.port(port_name, kind='in')
+            port._connection = InitializationConnection(list(content), port)
+        replicas.append(replica)
+
+    for port_name, senders, capacity in inputs:
+        split = graph.add_component('{}_split'.format(name), LoadBalance)
+        for sender in senders:
+            graph.connect(sender, split.ports.IN, capacity)
+        for i, replica in enumerate(replicas):
+            graph.connect(split.ports.OUT.get_element(i, create=True),
+                          replica.port(port_name, kind='in'))
+        for export_name, exported in exported_in:
+            if exported == port_name:
+                graph.inports[export_name] = split.ports.IN
+
+    for port_name, receivers, capacities in outputs:
+        merge = graph.add_component(
+            '{}_{}_merge'.format(name, re.sub(r'\W', '', port_name)),
+            SubstreamSensitiveMerge)
+        for i, replica in enumerate(replicas):
+            graph.connect(replica.port(port_name, kind='out'),
+                          merge.ports.IN.get_element(i, create=True))
+        for receiver, capacity in zip(receivers, capacities):
+            graph.connect(merge.ports.OUT, receiver, capacity)
+        for export_name, exported in exported_out:
+            if exported == port_name:
+                graph.outports[export_name] = merge.ports.OUT
+
+
+def _replicated_names(graph):
+    return [name for name, comp in graph.get_components().items()
+            if comp.metadata.get('parallelism', 1) > 1]
+
+
+def expand_parallelism(graph, copy=True):
+    """
+    Expand components whose metadata specifies a ``parallelism`` greater
+    than 1 into that many replicas.
+
+    Packets are distributed to the replicas by a ``LoadBalance`` component and
+    collected by a ``SubstreamSensitiveMerge`` per output port, so substreams
+    are kept intact. Initial packets are given to every replica. Replicated
+    components may receive at most one stream. Exported ports of replicated
+    components are re-exported from the split and merge components.
+
+    A graph must be expanded before a ``Network`` is created for it, and
+    before any references to its components or ports are taken, since
+    expanding a copy leaves those references pointing into `graph`.
+
+    Parameters
+    ----------
+    graph : ``Graph``
+    copy : bool
+        expand a deep copy of `graph`, rather than `graph` itself. The copy is
+        only made if any component is replicated
+
+    Returns
+    -------
+    Tuple[``Graph``, Dict[str, List[str]]]
+        the expanded graph, and a map of the names of replicated components
+        to the names of their replicas. Other components keep their names in
+        the expanded graph
+    """
+    names = _replicated_names(graph)
+    if not names:
+        return graph, {}
+
+    if copy:
+        graph = graph.copy()
+    replicas = OrderedDict()
+    for name in names:
+        component = graph.component(name)
+        count = component.metadata['parallelism']
+        _replicate_component(graph, component, count)
+        replicas[name] = ['{}_{}'.format(name, i) for i in range(count)]
+    return graph, replicas
+
+
 class Network(object):
     """
     Responsible for executing a ``Graph`` instance.
     """
 
-    def __init__(self, graph, deadlock_test_interval=1):
+    def __init__(self, graph, deadlock_test_interval=1, yield_budget=None,
+                 yield_interval=None):
         """
 
+        Components whose metadata specifies a ``parallelism`` must first be
+        replicated with `expand_parallelism`.
+
+        If any component specifies a ``priority``, runners are scheduled by a
+        ``PriorityScheduler``.
+
         Parameters
         ----------
         graph : ``Graph``
         deadlock_test_interval : int
-        """
+        yield_budget : Optional[int]
+            components yield to other greenlets after this many sends and
+            receives without otherwise switching. May be overridden per
+            component with the ``yield_budget`` node metadata.
+        yield_interval : Optional[float]
+            components yield to other greenlets after running for this many
+            seconds without otherwise switching. May be overridden per
+            component with the ``yield_interval`` node metadata.
+        """
+        replicated = _replicated_names(graph)
+        if replicated:
+            raise FlowError(
+                "Components with a parallelism must be replicated with "
+                "expand_parallelism() before the network is created: "
+                "{}".format(', '.join(replicated)))
         # self.logger = logger
         # type: Graph
         self.graph = graph
@@ -722,6 +881,13 @@ class Network(object):
         # type: Network
         self.parent_network = None
         self.deadlock_test_interval = deadlock_test_interval
+        self.yield_budget = yield_budget
+        self.yield_interval = yield_interval
+        # only used by the root network
+        # type: Optional[PriorityScheduler]
+        self.scheduler = None
+        if PriorityScheduler.uses_scheduling(self.graph):
+            self.scheduler = PriorityScheduler()
 
         self.active = False  # used for deadlock detection
 
@@ -752,10 +918,11 @@ class Network(object):
         # FIXME: these were AtomicInteger instances, with built-in locking.
         # might not be safe to make them regular ints
         self.sends = self.receives = self.creates = self.drops = self.drop_olds = None
+        self.forced_yields = None
 
     def __getstate__(self):
         data = self.__dict__.copy()
-        for k in ('cdl', 'runners', 'msgs'):
+        for k in ('cdl', 'runners', 'msgs', 'scheduler'):
             data.pop(k)
         if self.runners is not None:
             data['runners'] = [runner.status for runner in self.runners]
@@ -764,6 +931,9 @@ class Network(object):
     def __setstate__(self, data):
         runners = data.pop('runners', None)
         self.__dict__.update(data)
+        self.scheduler = None
+        if PriorityScheduler.uses_scheduling(self.graph):
+            self.scheduler = PriorityScheduler()
         if runners is not None:
             self._build_runners()
             for runner, status in zip(self.runners, runners):
@@ -785,6 +955,7 @@ class Network(object):
         self.creates = 0
         self.drops = 0
         self.drop_olds = 0
+        self.forced_yields = 0
 
         for name, comp in self.graph._components.items():
             comp.init()
@@ -828,6 +999,7 @@ class Network(object):
         logger.info(" drops (old):    %d", self.drop_olds)
         logger.info(" sends:          %d", self.sends)
         logger.info(" receives:       %d", self.receives)
+        logger.info(" forced yields:  %d", self.forced_yields)
 
         if self.error is not None:
             logger.error("re-rasing error")
@@ -848,10 +1020,19 @@ class Network(object):
         """
         Populate `self.runners` with a runner for each component.
         """
+        root = self
+        while root.parent_network is not None:
+            root = root.parent_network
+
         self.runners = []
         for comp in self.graph._components.values():
             runner = ComponentRunner(comp, self)
             comp._runner = runner
+            runner.set_yield_budget(
+                comp.metadata.get('yield_budget', root.yield_budget),
+                comp.metadata.get('yield_interval', root.yield_interval))
+            if root.scheduler is not None:
+                root.scheduler.register(runner)
             self.runners.append(runner)
             runner.status = StatusValues.NOT_STARTED
 
@@ -902,6 +1083,8 @@ class Network(object):
         self._build_runners()
         self._open_ports()
         self_starters = [r for r in self.runners if r.self_starting]
+        # start higher priority runners first
+        self_starters.sort(key=lambda r: r.priority, reverse=True)
 
         if not self_starters:
             raise FlowError("No self-starters found")
@@ -1007,9 +1190,15 @@ class Network(object):
                     terminated = False
 
                 if status == StatusValues.SUSP_RECV:
+                    if not runner.curr_conn.is_empty():
+                        # woken, but not yet resumed
+                        return False
                     objs = [runner.curr_conn]
                 elif status == StatusValues.SUSP_SEND:
                     objs = runner.curr_outport._connections
+                    if not all(c.is_full() for c in objs):
+                        # woken, but not yet resumed
+                        return False
                 else:
                     objs = [runner]
 
@@ -1049,6 +1238,27 @@ class Network(object):
     # FIXME: consider removing this and the next
     # these packet count methods overlap with the creates/sends/receives counts.
     # they're special built for use by one component
+    def get_starvation_stats(self):
+        """
+        Get per-component metrics collected by the cooperative yield budget.
+
+        Only components with a yield budget or interval are tracked.
+
+        Returns
+        -------
+        Dict[str, Dict[str, Union[int, float]]]
+            map of component name to the number of yields forced by the budget
+            (``forced_yields``) and the longest time, in seconds, the
+            component ran without switching (``max_run_time``)
+        """
+        return {
+            runner.component.get_name(): {
+                'forced_yields': runner.forced_yields,
+                'max_run_time': runner.max_run_time,
+            }
+            for runner in self.runners if runner._yield_enabled
+        }
+
     def get_packet_counts(self):
         """
         Get a dictionary of connection to count of packet received
@@ -1072,10 +1282,133 @@ class Network(object):
         self._packet_counts[connection] += 1
 
 
+def _get_capture_ports(graph, capture_results):
+    """
+    Get the names of the exported outports to capture.
+
+    Parameters
+    ----------
+    graph : ``Graph``
+    capture_results : Union[bool, List[str]]
+
+    Returns
+    -------
+    List[str]
+    """
+    if capture_results is True:
+        outports = list(graph.outports.keys())
+        if not outports:
+            raise FlowError("Cannot capture results: graph has no exported "
+                            "outports")
+        return outports
+    elif capture_results is False:
+        return []
+    else:
+        unknown = set(capture_results).difference(graph.outports)
+        if unknown:
+            raise FlowError("Unknown outports: {}".format(
+                ', '.join(sorted(unknown))))
+        return list(capture_results)
+
+
+# graphs being run in place: id of the graph -> (owner, hub, event set on
+# release). the owner is the greenlet running the graph, or the
+# ``GraphService`` serving it
+_graph_claims = {}
+
+
+def _claim_graph(graph, owner=None):
+    """
+    Claim `graph` for a run in place, which attaches ports to its exported
+    ports and initializes them for the duration of the run.
+
+    Runs of the same graph from other greenlets wait for the current run to
+    end. Release with `_release_graph`.
+
+    Parameters
+    ----------
+    graph : ``Graph``
+    owner : Optional[Any]
+        defaults to the current greenlet
+
+    Raises
+    ------
+    FlowError
+        if the graph is being run by the current greenlet, for example by a
+        generator returned by `iter_graph` which has not been exhausted, is
+        being served by a ``GraphService``, or is being run by another
+        thread: waiting would never end, or could not be done safely
+    """
+    import gevent
+    from gevent.event import Event
+
+    current = gevent.getcurrent()
+    hub = gevent.get_hub()
+    while id(graph) in _graph_claims:
+        claimant, claimant_hub, released = _graph_claims[id(graph)]
+        if claimant is current:
+            raise FlowError("{} is already being run by this "
+                            "greenlet".format(graph))
+        elif not isinstance(claimant, gevent.greenlet.greenlet):
+            raise FlowError("{} is being served by {!r}".format(
+                graph, claimant))
+        elif claimant_hub is not hub:
+            raise FlowError("{} is being run by another thread".format(
+                graph))
+        released.wait()
+    _graph_claims[id(graph)] = (owner or current, hub, Event())
+
+
+def _release_graph(graph):
+    _, _, released = _graph_claims.pop(id(graph))
+    released.set()
+
+
+def _connect_temporarily(outport, inport, capacity):
+    """
+    Connect two ports without notifying the graph's listeners.
+
+    Used to attach the components which feed or collect a graph's exported
+    ports for the duration of a run. Undo with `_disconnect_temporarily`.
+    """
+    connection = Connection()
+    connection.connect(inport, outport, capacity)
+    inport._connection = connection
+
+
+def _disconnect_temporarily(outport, inport):
+    outport._connections.remove(inport._connection)
+    inport._connection.outports.discard(outport)
+    if not inport._connection.outports:
+        inport._connection = None
+
+
+def _get_exported_port(ports, name, kind):
+    """
+    Get the name of an exported port, defaulting to the only one.
+    """
+    if name is not None:
+        if name not in ports:
+            raise FlowError("Unknown {}port: {}".format(kind, name))
+        return name
+    if len(ports) != 1:
+        raise FlowError("The graph has {} exported {}ports: the {}port "
+                        "must be given".format(len(ports), kind, kind))
+    return next(iter(ports))
+
+
 def run_graph(graph, initializations=None, capture_results=False):
     """
     Run a graph.
 
+    The graph is run in place: initial packets are set on its exported
+    inports, and a ``Capture`` is connected to each captured outport, for the
+    duration of the run only. Its components are therefore not copied, and
+    keep any state they set while running. Since they cannot take part in two
+    runs at once, concurrent runs of the same graph from other greenlets wait
+    for each other. If any component has a ``parallelism``, an expanded copy
+    of the graph is run instead (see `expand_parallelism`).
+
     Parameters
     ----------
     graph : ``rill.engine.network.Graph``
@@ -1092,40 +1425,181 @@ def run_graph(graph, initializations=None, capture_results=False):
     """
     from rill.components.basic import Capture
 
-    if capture_results is True:
-        outports = graph.outports.keys()
-        if not outports:
-            raise FlowError("Cannot capture results: graph has no exported "
-                            "outports")
-    elif capture_results is False:
-        outports = []
-    else:
-        outports = capture_results
-
+    outports = _get_capture_ports(graph, capture_results)
     initializations = initializations or {}
+    # only copies the graph if any components are replicated
+    graph, _ = expand_parallelism(graph)
+    unknown = set(initializations).difference(graph.inports)
+    if unknown:
+        raise FlowError("Unknown inports: {}".format(
+            ', '.join(sorted(unknown))))
+
+    _claim_graph(graph)
+    claimed = graph
+    if outports:
+        # the captures are only added to a shallow copy, so the components
+        # of the passed graph are shared, but its listeners are not notified
+        graph = graph.copy(deep=False)
 
-    if outports or initializations:
-        # use a wrapper so we don't modify the passed graph
-        # we could also copy the graph, but seeing as we're working with
-        # inports and outports, it might be best to operate on the graph as a
-        # SubGraph to ensure consistent behavior
-        wrapper = Graph()
-        apply = wrapper.add_graph('Apply', graph)
-
+    initialized = []
+    captures = OrderedDict()
+    try:
         for (port_name, content) in initializations.items():
-            wrapper.initialize(content, apply.port(port_name))
+            inport = graph.inports[port_name]
+            inport.initialize(content)
+            initialized.append(inport)
 
-        captures = {}
         for port_name in outports:
-            capture_name = 'Capture_{}'.format(port_name)
-            capture = wrapper.add_component(capture_name, Capture)
-            wrapper.connect(apply.port(port_name), capture.port('IN'))
+            capture = graph.add_component(
+                graph._get_unique_name('Capture_{}'.format(port_name)),
+                Capture)
+            _connect_temporarily(graph.outports[port_name],
+                                 capture.port('IN'), graph.default_capacity)
             captures[port_name] = capture
-        graph = wrapper
 
-    Network(graph).go()
+        Network(graph).go()
+    finally:
+        for inport in initialized:
+            inport.uninitialize()
+        for port_name, capture in captures.items():
+            _disconnect_temporarily(graph.outports[port_name],
+                                    capture.port('IN'))
+        _release_graph(claimed)
 
     # FIXME: re-raise errors?
 
     if outports:
         return {name: capture.value for (name, capture) in captures.items()}
+
+
+def iter_graph(graph, iterable, inport=None, outport=None,
+               initializations=None, buffer_size=None):
+    """
+    Run a graph as a generator.
+
+    The items of `iterable` are sent to the exported `inport` as separate
+    packets, and the contents of the packets sent by the exported `outport`
+    are yielded as they are produced. Only as many items are taken from
+    `iterable` as the network has room for, and the network waits whenever
+    the consumer falls `buffer_size` results behind, so a large input is
+    processed in constant memory.
+
+    Like ``run_graph``, the graph is run in place (unless components are
+    replicated), from the first item requested until the generator is
+    exhausted or closed. Other runs of the graph wait until then, and running
+    it again from the consuming greenlet meanwhile raises ``FlowError``.
+    Closing the generator early terminates the network.
+
+    Parameters
+    ----------
+    graph : ``rill.engine.network.Graph``
+    iterable : Iterable[Any]
+    inport : Optional[str]
+        name of the exported inport to feed. May be omitted if the graph has
+        only one
+    outport : Optional[str]
+        name of the exported outport to yield from. May be omitted if the
+        graph has only one
+    initializations : Optional[Dict[str, Any]]
+        map of other exported inport names to initial content
+    buffer_size : Optional[int]
+        number of results held for the consumer. Defaults to the graph's
+        default connection capacity
+
+    Returns
+    -------
+    Iterator[Any]
+    """
+    from gevent.queue import Queue
+
+    initializations = initializations or {}
+    graph, _ = expand_parallelism(graph)
+    feed = graph.inports
+    if inport is None:
+        feed = OrderedDict((name, port) for name, port in feed.items()
+                           if name not in initializations)
+    inport = _get_exported_port(feed, inport, 'in')
+    _check_feed(graph, inport, initializations)
+    outport = _get_exported_port(graph.outports, outport, 'out')
+    unknown = set(initializations).difference(graph.inports)
+    if unknown:
+        raise FlowError("Unknown inports: {}".format(
+            ', '.join(sorted(unknown))))
+    if buffer_size is None:
+        buffer_size = graph.default_capacity
+
+    return _iter_graph(graph, iterable, inport, outport, initializations,
+                       Queue(buffer_size))
+
+
+def _check_feed(graph, inport, initializations):
+    # another run in place may have connected the inport for now
+    if inport in initializations or (graph.inports[inport].is_connected()
+                                     and id(graph) not in _graph_claims):
+        raise FlowError("Cannot feed inport {}: it is already "
+                        "initialized".format(inport))
+
+
+def _iter_graph(graph, iterable, inport, outport, initializations, queue):
+    # a generator, so that invalid arguments to iter_graph are reported when
+    # it is called, rather than when iteration starts
+    _claim_graph(graph)
+    results = None
+    try:
+        _check_feed(graph, inport, initializations)
+        results = _iter_claimed_graph(graph, iterable, inport, outport,
+                                      initializations, queue)
+        for content in results:
+            yield content
+    finally:
+        if results is not None:
+            results.close()
+        _release_graph(graph)
+
+
+def _iter_claimed_graph(graph, iterable, inport, outport, initializations,
+                        queue):
+    import gevent
+    from rill.components.basic import ReadIterable, WriteQueue
+
+    end = object()
+    graph = graph.copy(deep=False)
+    read = graph.add_component(graph._get_unique_name('_ReadIterable'),
+                               ReadIterable, IN=iterable)
+    write = graph.add_component(graph._get_unique_name('_WriteQueue'),
+                                WriteQueue, QUEUE=queue)
+    network = Network(graph)
+    initialized = []
+    runner = None
+
+    _connect_temporarily(read.port('OUT'), graph.inports[inport],
+                         graph.default_capacity)
+    _connect_temporarily(graph.outports[outport], write.port('IN'),
+                         graph.default_capacity)
+    try:
+        for (port_name, content) in initializations.items():
+            port = graph.inports[port_name]
+            port.initialize(content)
+            initialized.append(port)
+
+        runner = gevent.spawn(network.go)
+        # mark the end of the results once the network stops, whether it
+        # succeeded or not
+        runner.link(lambda g: gevent.spawn(queue.put, end))
+        while True:
+            content = queue.get()
+            if content is end:
+                break
+            yield content
+        # re-raise the network's error, if any
+        runner.get()
+    finally:
+        if runner is not None and not runner.ready():
+            # closed early: stop components blocked on the queue or on ports
+            network.terminate()
+            gevent.killall(network.runners)
+            runner.kill()
+        for port in initialized:
+            port.uninitialize()
+        _disconnect_temporarily(read.port('OUT'), graph.inports[inport])
+        _disconnect_temporarily(graph.outports[outport], write.port('IN'))
@@ -1,12 +1,19 @@
 from abc import ABCMeta, abstractmethod
+import heapq
+import itertools
+import random
+import weakref
 
 from typing import List, Union, Any
 
 from rill.engine.port import (Port, ArrayPort, BasePortCollection,
                               PortInterface, OUT_NULL)
 from rill.engine.packet import Packet
+from rill.engine.status import StatusValues
 from rill.compat import *
 
+import gevent.event
+
 
 @add_metaclass(ABCMeta)
 class OutputInterface(PortInterface):
@@ -180,8 +187,68 @@ class BaseOutputCollection(BasePortCollection, OutputInterface):
 class LoadBalancedOutputCollection(BaseOutputCollection):
     """
     Provides methods for sending to the optimal port within the collection.
+
+    The downstream packet count of each port is kept in a heap, which the
+    connections update as packets are queued and consumed, so finding the
+    least loaded port is O(log n) rather than a scan of every port.
+
+    For very wide arrays, `choices` enables "power of d choices" mode: that
+    many ports are sampled at random on each send and the least loaded of them
+    is chosen, which is O(1) and requires no bookkeeping.
     """
 
+    def __init__(self, component, ports, choices=None):
+        """
+        Parameters
+        ----------
+        component : ``rill.engine.component.Component``
+        ports : Iterable[``BasePort``]
+        choices : Optional[int]
+            number of ports to sample per send. If None, the least loaded of
+            all ports is used.
+        """
+        super(LoadBalancedOutputCollection, self).__init__(component, ports)
+        self._choices = choices
+        self._port_list = self.ports()
+        # type: Dict[OutputPort, int]
+        self._backlog = {}
+        # heap of (backlog, sequence, port). entries whose backlog differs
+        # from `_backlog` are stale and discarded lazily
+        self._heap = []
+        self._sequence = itertools.count()
+        # type: Dict[rill.engine.inputport.Connection, List[OutputPort]]
+        self._watched = {}
+        if choices is None:
+            ref = weakref.ref(self)
+            for port in self._port_list:
+                for connection in port._connections:
+                    self._watched.setdefault(connection, []).append(port)
+            for connection in self._watched:
+                connection.watchers.append(ref)
+            for port in self._port_list:
+                self._update(port)
+
+    def _update(self, port):
+        count = port.downstream_count()
+        self._backlog[port] = count
+        heapq.heappush(self._heap, (count, next(self._sequence), port))
+        if len(self._heap) > 4 * len(self._backlog) + 16:
+            # too many stale entries: rebuild from the current backlogs
+            self._heap = [(count, next(self._sequence), port)
+                          for port, count in self._backlog.items()]
+            heapq.heapify(self._heap)
+
+    def backlog_changed(self, connection):
+        """
+        Called by a watched connection when its packet count changes.
+
+        Parameters
+        ----------
+        connection : ``rill.engine.inputport.Connection``
+        """
+        for port in self._watched[connection]:
+            self._update(port)
+
     def next_port(self):
         """
         Find the port with the fewest number of downstream packets.
@@ -190,14 +257,19 @@ class LoadBalancedOutputCollection(BaseOutputCollection):
         -------
         ``OutputPort``
         """
-        result = None
-        backlog = None
-        for port in self.ports():
-            count = port.downstream_count()
-            if backlog is None or count <= backlog:
-                backlog = count
-                result = port
-        return result
+        if self._choices is not None:
+            ports = self._port_list
+            if len(ports) > self._choices:
+                ports = random.sample(ports, self._choices)
+            return min(ports, key=lambda port: port.downstream_count())
+
+        heap = self._heap
+        while heap:
+            count, _, port = heap[0]
+            if self._backlog[port] == count:
+                return port
+            heapq.heappop(heap)
+        return None
 
     def send(self, packet):
         """
@@ -206,15 +278,73 @@ class LoadBalancedOutputCollection(BaseOutputCollection):
         return self.next_port().send(packet)
 
 
-import gevent.pool
+class ForkedOutputCollection(BaseOutputCollection):
+    """
+    Provides methods for sending a copy of a packet to every port within the
+    collection.
 
+    Ports with room are sent to inline. If some are full, the sender is
+    suspended until their connections report that space has freed, so no
+    greenlets are spawned per packet.
+    """
+
+    def __init__(self, component, ports):
+        """
+        Parameters
+        ----------
+        component : ``rill.engine.component.Component``
+        ports : Iterable[``BasePort``]
+        """
+        super(ForkedOutputCollection, self).__init__(component, ports)
+        self._port_list = self.ports()
+        self._wakeup = gevent.event.Event()
+        ref = weakref.ref(self)
+        for port in self._port_list:
+            for connection in port._connections:
+                connection.watchers.append(ref)
+
+    def backlog_changed(self, connection):
+        """
+        Called by a watched connection when its packet count changes.
+
+        Parameters
+        ----------
+        connection : ``rill.engine.inputport.Connection``
+        """
+        self._wakeup.set()
+
+    @staticmethod
+    def _is_ready(port):
+        """
+        Whether sending to `port` would return without suspending.
+        """
+        return all(not c.is_full() or c.is_closed() for c in port._connections)
 
-class ForkedOutputCollection(BaseOutputCollection):
     def send(self, packet):
         """
+        Send a copy of `packet` to every port.
+
+        Returns
+        -------
+        bool
+            whether the packet was sent to any port
         """
-        # get results in parallel
-        group = gevent.pool.Group()
-        failed = list(group.imap_unordered(lambda x: x.send(packet.clone()),
-                                           self.ports()))
-        return any(failed)
+        sent = False
+        pending = self._port_list
+        while pending:
+            waiting = []
+            for port in pending:
+                if self._is_ready(port):
+                    sent = port.send(packet.clone()) or sent
+                else:
+                    waiting.append(port)
+            pending = waiting
+            if pending:
+                self._wakeup.clear()
+                self.sender.curr_outport = pending[0]
+                self.sender.status = StatusValues.SUSP_SEND
+                try:
+                    self._wakeup.wait()
+                finally:
+                    self.sender.status = StatusValues.ACTIVE
+        return sent
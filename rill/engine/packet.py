@@ -174,5 +174,7 @@ class Packet(object):
         return self.get_root().drop(self)
 
     def clone(self):
-        # FIXME: clone attrs and chains
-        return Packet(self._content, self.owner, self._type)
+        # FIXME: clone chains
+        packet = Packet(self._content, self.owner, self._type)
+        packet.attrs.update(self.attrs)
+        return packet
@@ -88,7 +88,6 @@ class PortDefinition(object):
         -------
         dict
         """
-        from schematics.types import ModelType
         spec = {
             'id': self.name,
             'description': self.description,
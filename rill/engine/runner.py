@@ -1,11 +1,12 @@
 import logging
-from threading import Condition
+import time
 
+import gevent
 from gevent import Greenlet, GreenletExit
 from gevent.lock import RLock
 from termcolor import colored
 
-from rill.engine.utils import LogFormatter
+from rill.engine.utils import Condition, LogFormatter
 from rill.engine.status import StatusValues
 from rill.engine.exceptions import FlowError, ComponentError
 from rill.engine.port import OUT_NULL, IN_NULL
@@ -55,6 +56,24 @@ class ComponentRunner(Greenlet):
         # FIXME: allow this value to be set.  should we read it from the Network, or do we need per-component control?
         # FIXME: this feature is broken right now due to multiple output ports
         self.ignore_packet_count_error = True
+
+        # set by rill.engine.scheduler.PriorityScheduler.register
+        # type: rill.engine.scheduler.PriorityScheduler
+        self.scheduler = None
+        self.priority = 0
+
+        # cooperative yield budget (the runner's time slice): yield after this
+        # many sends and receives, or this many seconds, without a switch. set
+        # by the network
+        self.yield_budget = None
+        self.yield_interval = None
+        self._yield_enabled = False
+        self._ops_since_switch = 0
+        self._switched_at = None
+        # starvation metrics
+        self.forced_yields = 0
+        self.max_run_time = 0.0
+
         self._status = StatusValues.NOT_STARTED
 
     def __str__(self):
@@ -147,8 +166,65 @@ class ComponentRunner(Greenlet):
             self.logger.debug(
                 "Changing status {} -> {}".format(self._status, new_status),
                 component=self)
+            if self._yield_enabled:
+                if new_status == StatusValues.ACTIVE:
+                    self._reset_yield_budget()
+                elif self._status == StatusValues.ACTIVE:
+                    self._record_run_time()
             self._status = new_status
 
+    # Yield budget --
+
+    def set_yield_budget(self, budget=None, interval=None):
+        """
+        Set the cooperative yield budget.
+
+        The runner yields after `budget` sends and receives, or after running
+        for `interval` seconds, without otherwise switching. Under a
+        ``rill.engine.scheduler.PriorityScheduler`` it then also gives way to
+        runners of a higher priority.
+
+        Parameters
+        ----------
+        budget : Optional[int]
+        interval : Optional[float]
+        """
+        self.yield_budget = budget
+        self.yield_interval = interval
+        self._yield_enabled = bool(budget or interval)
+        self._reset_yield_budget()
+
+    def _reset_yield_budget(self):
+        self._ops_since_switch = 0
+        self._switched_at = time.time()
+
+    def _record_run_time(self):
+        run_time = time.time() - self._switched_at
+        if run_time > self.max_run_time:
+            self.max_run_time = run_time
+
+    def count_operation(self):
+        """
+        Count a send or receive against the yield budget, and yield if the
+        budget has been used up.
+
+        Ports call this before taking a packet from a connection, never
+        after, so that a packet is never held across the switch.
+        """
+        self._ops_since_switch += 1
+        if (self.yield_budget and
+                self._ops_since_switch >= self.yield_budget) or \
+                (self.yield_interval and
+                 time.time() - self._switched_at >= self.yield_interval):
+            self._record_run_time()
+            self.forced_yields += 1
+            self.network.forced_yields += 1
+            if self.scheduler is not None:
+                self.scheduler.yield_(self)
+            else:
+                gevent.sleep(0)
+            self._reset_yield_budget()
+
     def is_terminated(self):
         """
         Return whether the component has terminated.
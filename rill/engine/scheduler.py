@@ -0,0 +1,125 @@
+import time
+from collections import defaultdict
+
+import gevent
+import gevent.event
+
+
+class PriorityScheduler(object):
+    """
+    Cooperative, priority-aware scheduling of component runners.
+
+    gevent runs greenlets in FIFO order and only switches when one blocks, so
+    a busy component can hold up everything else. Runners with a priority get
+    a cooperative yield budget (see
+    ``rill.engine.runner.ComponentRunner.set_yield_budget``), and when a
+    runner uses up its budget it waits while any runner of a higher priority
+    is waiting to resume.
+
+    Only runners which have themselves yielded at the end of their budget are
+    considered waiting: a runner which blocks, on a port, a sleep or anything
+    else, holds up no one.
+
+    Priorities are read from the ``priority`` node metadata: an int, higher
+    runs first. Runners without one have priority 0 and are only budgeted if
+    the network or their ``yield_budget`` metadata say so.
+    """
+    default_budget = 50
+
+    def __init__(self, default_budget=None, starvation_timeout=0.05):
+        """
+        Parameters
+        ----------
+        default_budget : Optional[int]
+            yield budget of runners which have a priority, but no budget of
+            their own
+        starvation_timeout : float
+            maximum number of seconds a runner waits for higher priority
+            runners at the end of its budget, so that it cannot be starved
+            indefinitely
+        """
+        if default_budget is not None:
+            self.default_budget = default_budget
+        self.starvation_timeout = starvation_timeout
+        # map of priority to number of runners waiting to resume
+        # type: Dict[int, int]
+        self._waiting = defaultdict(int)
+        self._resumed = gevent.event.Event()
+
+    @staticmethod
+    def uses_scheduling(graph):
+        """
+        Whether any component in `graph`, or in its subgraphs, specifies a
+        priority.
+
+        Parameters
+        ----------
+        graph : ``rill.engine.network.Graph``
+
+        Returns
+        -------
+        bool
+        """
+        from rill.engine.subnet import SubGraph
+        for comp in graph.get_components().values():
+            if 'priority' in comp.metadata:
+                return True
+            if isinstance(comp, SubGraph) and comp.subgraph is not None and \
+                    PriorityScheduler.uses_scheduling(comp.subgraph):
+                return True
+        return False
+
+    def register(self, runner):
+        """
+        Read the priority of `runner` from its component's metadata.
+
+        Must be called after the runner's yield budget has been set.
+
+        Parameters
+        ----------
+        runner : ``rill.engine.runner.ComponentRunner``
+        """
+        metadata = runner.component.metadata
+        runner.scheduler = self
+        runner.priority = metadata.get('priority', 0)
+        if 'priority' in metadata and not runner._yield_enabled and \
+                'yield_budget' not in metadata:
+            runner.set_yield_budget(self.default_budget)
+
+    def has_higher(self, priority):
+        """
+        Whether any runner with a priority higher than `priority` is waiting
+        to resume.
+
+        Parameters
+        ----------
+        priority : int
+
+        Returns
+        -------
+        bool
+        """
+        return any(count for p, count in self._waiting.items() if p > priority)
+
+    def yield_(self, runner):
+        """
+        End the time slice of `runner`.
+
+        Parameters
+        ----------
+        runner : ``rill.engine.runner.ComponentRunner``
+        """
+        self._waiting[runner.priority] += 1
+        try:
+            # let runners which are ready to run go first
+            gevent.sleep(0)
+            deadline = time.time() + self.starvation_timeout
+            while self.has_higher(runner.priority):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._resumed.clear()
+                self._resumed.wait(remaining)
+        finally:
+            self._waiting[runner.priority] -= 1
+            self._resumed.set()
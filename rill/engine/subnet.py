@@ -5,7 +5,7 @@ from typing import Type
 
 from rill.engine.component import Component, inport, outport, logger
 from rill.engine.portdef import InputPortDefinition, OutputPortDefinition
-from rill.engine.network import Network, Graph
+from rill.engine.network import Network, Graph, expand_parallelism
 from rill.engine.status import StatusValues
 from rill.engine.inputport import InitializationConnection
 from rill.engine.exceptions import FlowError
@@ -229,6 +229,15 @@ class SubGraph(Component):
         inherited = super(SubGraph, cls).outport_definitions
         return merge_portdefs(exported, inherited)
 
+    @classmethod
+    def _spec_key(cls):
+        if cls.subgraph is None:
+            cls._init_graph()
+        # the exported ports may change after the class is created
+        return (super(SubGraph, cls)._spec_key(),
+                tuple(cls.subgraph.inports.items()),
+                tuple(cls.subgraph.outports.items()))
+
     @classmethod
     def _init_graph(cls):
         """
@@ -246,6 +255,9 @@ class SubGraph(Component):
         # the graph is a class attribute, so we have to make a deep copy to
         # avoid side-effects
         graph = self.subgraph.copy()
+        # replicate components before the exported ports are connected to
+        # the proxies of this component's ports
+        expand_parallelism(graph, copy=False)
         for (name, internal_port) in graph.inports.items():
             subcomp = graph.add_component('_' + name, SubIn)
             graph.initialize(self.ports[name], subcomp.ports.PROXIED)
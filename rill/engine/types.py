@@ -6,14 +6,9 @@ import collections
 from collections import defaultdict
 #from types import NoneType
 
-import schematics.types
-import schematics.models
-from schematics.undefined import Undefined
-
 from rill.engine.exceptions import TypeHandlerError, PacketValidationError
 from rill.utils import importable_class_name, locate_class
 from rill.compat import *
-from rill.engine.jsonschema_types import to_jsonschema
 
 _type_handlers = []
 
@@ -249,11 +244,19 @@ class BasicTypeHandler(TypeHandler):
 
 
 class SchematicsTypeHandler(TypeHandler):
+    """
+    Type handler for schematics types and models.
+
+    schematics, and the handlers for the builtin types, are loaded on first
+    use, so that graphs whose ports are untyped do not pay for them.
+    """
     _type_lookup = {}
     _subtype_lookup = defaultdict(list)
     has_schema = True
 
     def __init__(self, type_def):
+        import schematics.types
+        import schematics.models
         if isinstance(type_def, schematics.types.BaseType):
             # nothing to do
             pass
@@ -280,9 +283,11 @@ class SchematicsTypeHandler(TypeHandler):
         super(SchematicsTypeHandler, self).__init__(type_def)
 
     def is_any(self):
+        import schematics.types
         return type(self.type_def) is schematics.types.BaseType
 
     def get_spec(self):
+        from rill.engine.jsonschema_types import to_jsonschema
         return to_jsonschema(self.type_def)
 
     def validate(self, value):
@@ -302,6 +307,8 @@ class SchematicsTypeHandler(TypeHandler):
 
     @staticmethod
     def is_schematics_obj(obj):
+        import schematics.types
+        import schematics.models
         bases = (schematics.types.BaseType, schematics.models.Model)
         return (isinstance(obj, schematics.types.BaseType) or
                 (inspect.isclass(obj) and issubclass(obj, bases)))
@@ -315,6 +322,7 @@ class SchematicsTypeHandler(TypeHandler):
         if not inspect.isclass(typ):
             return
 
+        _register_builtin_types()
         if typ in cls._type_lookup:
             return cls._type_lookup[typ]
 
@@ -344,6 +352,7 @@ class SchematicsTypeHandler(TypeHandler):
         -------
         None
         """
+        _register_builtin_types()
         # assert that schematics_type is valid:
         if not cls.is_schematics_obj(type_def):
             raise ValueError("type_def must be a BaseType "
@@ -416,9 +425,25 @@ def deserialize(data):
         return data
 
 
+_builtin_types_registered = False
+
+
 def _register_builtin_types():
+    """
+    Register the schematics types for the builtin python types.
+
+    Called on first use of ``SchematicsTypeHandler``, rather than at import.
+    """
+    global _builtin_types_registered
+    if _builtin_types_registered:
+        return
+    _builtin_types_registered = True
+
     import decimal
     import datetime
+    import schematics.types
+    # sets the primitive_type of the schematics types
+    import rill.engine.jsonschema_types
 
     SchematicsTypeHandler.register_type(int,
                                         schematics.types.IntType)
@@ -451,5 +476,4 @@ def _register_builtin_types():
                                             schematics.types.BaseType))
 
 
-_register_builtin_types()
 register_handler(SchematicsTypeHandler)
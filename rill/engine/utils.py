@@ -1,6 +1,9 @@
 import os
 import logging
+from collections import deque
+
 import gevent
+from gevent.event import Event
 from gevent.lock import RLock
 from termcolor import colored
 
@@ -8,6 +11,14 @@ is_patched = False
 
 
 def patch():
+    """
+    Monkey-patch the standard library for gevent.
+
+    rill never patches on import: applications which need blocking stdlib
+    calls to cooperate with the network should call this as early as
+    possible. Set the ``RILL_SKIP_GEVENT_PATCH`` environment variable to
+    disable it.
+    """
     global is_patched
     if is_patched or os.environ.get('RILL_SKIP_GEVENT_PATCH', False):
         return
@@ -108,6 +119,61 @@ class LogFormatter(logging.LoggerAdapter):
         return message, kwargs
 
 
+class Condition(object):
+    """
+    A condition variable for greenlets.
+
+    ``threading.Condition`` only cooperates with gevent once the standard
+    library has been monkey-patched: otherwise waiting on it blocks the whole
+    thread, and with it every greenlet on its hub. This one waits on gevent
+    events, so it works whether or not `patch` has been called.
+    """
+    def __init__(self, lock=None):
+        """
+        Parameters
+        ----------
+        lock : Optional[``gevent.lock.RLock``]
+        """
+        self._lock = RLock() if lock is None else lock
+        self._waiters = deque()
+
+    def __enter__(self):
+        return self._lock.__enter__()
+
+    def __exit__(self, *args):
+        return self._lock.__exit__(*args)
+
+    def wait(self, timeout=None):
+        """
+        Release the lock, wait until notified or until `timeout` expires,
+        then reacquire the lock.
+
+        Returns
+        -------
+        bool
+            False if `timeout` expired
+        """
+        waiter = Event()
+        self._waiters.append(waiter)
+        saved = self._lock._release_save()
+        try:
+            return waiter.wait(timeout)
+        finally:
+            self._lock._acquire_restore(saved)
+            if not waiter.is_set():
+                self._waiters.remove(waiter)
+
+    def notify(self, n=1):
+        """
+        Wake up to `n` waiting greenlets.
+        """
+        for _ in range(min(n, len(self._waiters))):
+            self._waiters.popleft().set()
+
+    def notify_all(self):
+        self.notify(len(self._waiters))
+
+
 class CountDownLatch(gevent.Greenlet):
     def __init__(self, count, freq=0.1):
         super(CountDownLatch, self).__init__()
@@ -0,0 +1,202 @@
+"""
+Executors run the networks started by a ``rill.runtime.Runtime``.
+
+``GreenletExecutor`` runs a network in a greenlet of the runtime's own
+process. ``ProcessExecutor`` runs it in a worker process, so that a busy
+network cannot slow down other graphs or the runtime's control channel.
+
+The worker is this module run as a script. It reads a json definition of the
+graph from stdin, runs it, and reports back on its original stdout with json
+lines::
+
+    {"command": "data", "payload": ...}    traced packets (network:data)
+    {"command": "done", "payload": {"error": null}}
+
+Writing ``stop`` to its stdin terminates the network.
+"""
+import os
+import sys
+import json
+import logging
+
+import gevent
+
+from rill.compat import *
+
+logger = logging.getLogger(__name__)
+
+
+class GreenletExecutor(object):
+    """
+    Runs a network in a greenlet of the current process.
+    """
+    def __init__(self, graph, graph_id, done_callback, trace=None):
+        """
+        Parameters
+        ----------
+        graph : ``rill.engine.network.Graph``
+        graph_id : str
+        done_callback : Callable[[], None]
+            called when the network finishes
+        trace : Optional[Callable[[dict], None]]
+            called with ``network:data`` payloads by executors which run the
+            network out of process. In process, packets are traced by
+            hooking ``rill.engine.inputport.Connection.send``
+        """
+        from rill.engine.network import Network, expand_parallelism
+        self.graph_id = graph_id
+        self.network = Network(expand_parallelism(graph)[0])
+        self.greenlet = gevent.Greenlet(self.network.go)
+        self.greenlet.link(lambda g: done_callback())
+
+    def start(self):
+        self.greenlet.start()
+
+    def stop(self):
+        self.network.terminate()
+        self.greenlet.join()
+
+    def ready(self):
+        """
+        Whether the network has finished.
+
+        Returns
+        -------
+        bool
+        """
+        return self.greenlet.ready()
+
+
+class ProcessExecutor(object):
+    """
+    Runs a network in a worker process.
+
+    The graph is sent to the worker in its serialized form, so its
+    components must be importable there, by the module and name given by
+    their type. Packets are traced by an ``rill.tracing.EdgeTracer`` in the
+    worker. Only the traced payloads come back to the runtime.
+    """
+    def __init__(self, graph, graph_id, done_callback, trace=None):
+        self.graph_id = graph_id
+        self.definition = graph.to_dict()
+        self.done_callback = done_callback
+        self.trace = trace
+        self.error = None
+        self.process = None
+        self.greenlet = None
+
+    def start(self):
+        from gevent import subprocess
+        # let the worker import whatever the runtime can
+        env = dict(os.environ,
+                   PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'rill.executors'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env)
+        request = {
+            'graph': self.definition,
+            'graph_id': self.graph_id,
+            'trace': self.trace is not None,
+        }
+        self.process.stdin.write(json.dumps(request).encode('utf-8') + b'\n')
+        self.process.stdin.flush()
+        self.greenlet = gevent.spawn(self._listen)
+        self.greenlet.link(lambda g: self.done_callback())
+
+    def _listen(self):
+        for line in self.process.stdout:
+            message = json.loads(line.decode('utf-8'))
+            command = message['command']
+            if command == 'data':
+                if self.trace is not None:
+                    self.trace(message['payload'])
+            elif command == 'done':
+                self.error = message['payload']['error']
+                if self.error:
+                    logger.error("Graph {} failed in worker process:\n"
+                                 "{}".format(self.graph_id, self.error))
+        self.process.wait()
+
+    def stop(self, timeout=5):
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.write(b'stop\n')
+                self.process.stdin.flush()
+            except (IOError, OSError):
+                # the worker already exited
+                pass
+        self.greenlet.join(timeout)
+        if not self.greenlet.ready():
+            self.process.kill()
+            self.greenlet.join()
+
+    def ready(self):
+        """
+        Whether the network has finished.
+
+        Returns
+        -------
+        bool
+        """
+        return self.greenlet is not None and self.greenlet.ready()
+
+
+def _worker():
+    # keep stdout for messages to the runtime, and send anything printed by
+    # rill or by components to stderr
+    out = os.fdopen(os.dup(1), 'w')
+    os.dup2(2, 1)
+
+    import traceback
+    import gevent.os
+    import gevent.socket
+    from rill.engine.utils import patch
+    patch()
+
+    from rill.engine.network import Graph, Network, expand_parallelism
+    from rill.engine.inputport import Connection
+    from rill.runtime import add_callback
+    from rill.tracing import EdgeTracer
+
+    def send(command, payload):
+        out.write(json.dumps({'command': command, 'payload': payload}) + '\n')
+        out.flush()
+
+    request = json.loads(sys.stdin.readline())
+    graph, _ = expand_parallelism(Graph.from_dict(request['graph']),
+                                  copy=False)
+    network = Network(graph)
+
+    if request['trace']:
+        tracer = EdgeTracer(lambda payload: send('data', payload),
+                            graph_id=request['graph_id'])
+        Connection.send = add_callback(Connection.send, tracer.trace)
+    else:
+        tracer = None
+
+    def wait_for_stop():
+        gevent.os.make_nonblocking(0)
+        buf = b''
+        while b'stop' not in buf:
+            gevent.socket.wait_read(0)
+            data = os.read(0, 1024)
+            if not data:
+                # the runtime went away
+                break
+            buf += data
+        network.terminate()
+
+    watcher = gevent.spawn(wait_for_stop)
+    error = None
+    try:
+        network.go()
+    except Exception:
+        error = traceback.format_exc()
+    watcher.kill()
+    if tracer is not None:
+        tracer.flush()
+    send('done', {'error': error})
+
+
+if __name__ == '__main__':
+    _worker()
@@ -66,9 +66,9 @@ def eager_merged(*ports):
     return EagerInputCollection(current_component(), ports)
 
 
-def load_balanced(*ports):
+def load_balanced(*ports, **kwargs):
     from rill.engine.outputport import LoadBalancedOutputCollection
-    return LoadBalancedOutputCollection(current_component(), ports)
+    return LoadBalancedOutputCollection(current_component(), ports, **kwargs)
 
 
 def forked(*ports):
@@ -6,21 +6,18 @@ from collections import OrderedDict
 import inspect
 import functools
 import traceback
-import datetime
 import weakref
 from functools import wraps
-import uuid
 
 import gevent
-import geventwebsocket
 
 from rill.engine.component import Component
-from rill.engine.inputport import Connection
 from rill.engine.outputport import OutputPort
 from rill.engine.network import Graph, Network
 from rill.engine.subnet import SubGraph, make_subgraph
 from rill.engine.types import FBP_TYPES, Stream
 from rill.engine.exceptions import FlowError
+from rill.utils import locate_class
 from rill.compat import *
 
 from typing import Union, Any, Iterator, Dict
@@ -264,15 +261,35 @@ class Runtime(object):
     """
     PROTOCOL_VERSION = '0.5'
 
-    def __init__(self):
+    def __init__(self, component_cache=None, executor_class=None):
+        """
+        Parameters
+        ----------
+        component_cache : Optional[``rill.discovery.ComponentCache``]
+            if provided, modules registered by name whose components are
+            cached are not imported until one of their components is added to
+            a graph
+        executor_class : Optional[type]
+            runs started graphs. Defaults to
+            ``rill.executors.GreenletExecutor``: pass
+            ``rill.executors.ProcessExecutor`` to run each graph in its own
+            worker process
+        """
         self.logger = logging.getLogger('%s.%s' % (self.__class__.__module__,
                                                    self.__class__.__name__))
 
-        self._component_types = {}  # Component metadata, keyed by component name
+        self.component_cache = component_cache
+        # Component metadata, keyed by component name. 'class' is None until
+        # a component registered from the cache is first used.
+        self._component_types = {}
         # type: Dict[str, Graph]
         self._graphs = {}  # Graph instances, keyed by graph ID
-        # type: Dict[str, Tuple[Greenlet, Network]]
-        self._executors = {}  # GraphExecutor instances, keyed by graph ID
+        if executor_class is None:
+            from rill.executors import GreenletExecutor
+            executor_class = GreenletExecutor
+        self.executor_class = executor_class
+        # type: Dict[str, GreenletExecutor]
+        self._executors = {}  # executor instances, keyed by graph ID
 
         self.logger.debug('Initialized runtime!')
 
@@ -304,7 +321,11 @@ class Runtime(object):
             'network:persist',
 
             # build graph on ui using graph protocol messages
-            'graph:getgraph'
+            'graph:getgraph',
+
+            # send several messages per frame, once the client enables it
+            # with runtime:batch
+            'rill:batch'
         ]
 
         all_capabilities = capabilities
@@ -338,6 +359,23 @@ class Runtime(object):
         """
         return [data['spec'] for data in self._component_types.values()]
 
+    def get_all_component_specs_json(self):
+        """
+        Get the component specs encoded as json.
+
+        Each spec is encoded once, when it is first requested.
+
+        Returns
+        -------
+        List[str]
+        """
+        result = []
+        for data in self._component_types.values():
+            if 'json' not in data:
+                data['json'] = json.dumps(data['spec'])
+            result.append(data['json'])
+        return result
+
     def register_component(self, component_class, overwrite=False):
         """
         Register a component class.
@@ -367,6 +405,54 @@ class Runtime(object):
             'spec': spec
         }
 
+    def get_component_class(self, name):
+        """
+        Get a registered component class, importing it if it was registered
+        from the component cache.
+
+        Parameters
+        ----------
+        name : str
+
+        Returns
+        -------
+        Type[``rill.engine.component.Component``]
+        """
+        data = self._component_types[name]
+        if data['class'] is None:
+            data['class'] = locate_class(data['location'])
+        return data['class']
+
+    def _register_cached_module(self, modname, overwrite=False):
+        """
+        Register the components of a module from the component cache.
+
+        Returns
+        -------
+        bool
+            whether the module was found in the cache
+        """
+        components = self.component_cache.get_module(modname)
+        if components is None:
+            return False
+
+        self.logger.info('Registering cached components in module: {}'.format(
+            modname))
+        for component in components:
+            name = component['spec']['name']
+            if name in self._component_types and not overwrite:
+                raise ValueError("Component {0} already registered".format(
+                    name))
+            self._component_types[name] = {
+                'class': None,
+                'location': component['class'],
+                'spec': component['spec']
+            }
+        if not components:
+            self.logger.warn('No components were found in module: {}'.format(
+                modname))
+        return True
+
     def register_module(self, module, overwrite=False):
         """
         Register all component classes within a module.
@@ -376,6 +462,9 @@ class Runtime(object):
         overwrite : bool
         """
         if isinstance(module, basestring):
+            if self.component_cache is not None and \
+                    self._register_cached_module(module, overwrite):
+                return
             module = pydoc.locate(module)
 
         if not inspect.ismodule(module):
@@ -385,7 +474,7 @@ class Runtime(object):
         self.logger.info('Registering components in module: {}'.format(
             module.__name__))
 
-        registered = 0
+        registered = []
         for obj_name, class_obj in inspect.getmembers(module):
             if (inspect.isclass(class_obj) and
                     class_obj is not Component and
@@ -393,12 +482,16 @@ class Runtime(object):
                     not issubclass(class_obj, SubGraph) and
                     issubclass(class_obj, Component)):
                 self.register_component(class_obj, overwrite)
-                registered += 1
+                registered.append(class_obj)
 
-        if registered == 0:
+        if not registered:
             self.logger.warn('No components were found in module: {}'.format(
                 module.__name__))
 
+        if self.component_cache is not None:
+            self.component_cache.set_module(module, registered)
+            self.component_cache.save()
+
     def get_source_code(self, component_name):
         # FIXME:
         component = None
@@ -418,27 +511,34 @@ class Runtime(object):
         if graph_id not in self._graphs:
             self.new_graph(graph_id)
         started = graph_id in self._executors
-        running = started and not self._executors[graph_id][0].ready()
+        running = started and not self._executors[graph_id].ready()
         print("get_status.  started {}, running {}".format(started, running))
         return started, running
 
-    def start(self, graph_id, done_callback):
+    def start(self, graph_id, done_callback, trace=None):
         """
         Execute a graph.
+
+        Parameters
+        ----------
+        graph_id : str
+        done_callback : Callable[[], None]
+            called when the network finishes
+        trace : Optional[Callable[[dict], None]]
+            called with ``network:data`` payloads for packets traced by
+            executors which run the network out of process
         """
         self.logger.debug('Graph {}: Starting execution'.format(graph_id))
 
         graph = self.get_graph(graph_id)
 
-        network = Network(graph)
-        executor = gevent.Greenlet(network.go)
+        executor = self.executor_class(graph, graph_id, done_callback, trace)
         # FIXME: should we delete the executor from self._executors on finish?
         # this has an impact on the result returned from get_status().  Leaving
         # it means that after completion it will be started:True, running:False
         # until stop() is triggered, at which point it will be started:False,
         # running:False
-        executor.link(lambda g: done_callback())
-        self._executors[graph_id] = (executor, network)
+        self._executors[graph_id] = executor
         executor.start()
         # if executor.is_running():
         #     raise ValueError('Graph {} is already started'.format(graph_id))
@@ -451,9 +551,7 @@ class Runtime(object):
         if graph_id not in self._executors:
             raise ValueError('Invalid graph: {}'.format(graph_id))
 
-        executor, network = self._executors[graph_id]
-        network.terminate()
-        executor.join()
+        self._executors[graph_id].stop()
         del self._executors[graph_id]
 
     def set_debug(self, graph_id, debug):
@@ -515,7 +613,7 @@ class Runtime(object):
 
         graph = self.get_graph(graph_id)
 
-        component_class = self._component_types[component_id]['class']
+        component_class = self.get_component_class(component_id)
         component = graph.add_component(node_id, component_class)
         component.metadata.update(metadata)
 
@@ -542,7 +640,7 @@ class Runtime(object):
     def set_node_metadata(self, graph_id, node_id, metadata):
         graph = self.get_graph(graph_id)
         component = graph.component(node_id)
-        for key, value in metadata.items():
+        for key, value in list(metadata.items()):
             if value is None:
                 metadata.pop(key)
                 component.metadata.pop(key, None)
@@ -584,7 +682,7 @@ class Runtime(object):
         inport = self._get_port(graph, tgt, kind='in')
         edge_metadata = inport._connection.metadata.setdefault(outport, {})
 
-        for key, value in metadata.items():
+        for key, value in list(metadata.items()):
             if value is None:
                 metadata.pop(key)
                 edge_metadata.pop(key, None)
@@ -689,403 +787,39 @@ class Runtime(object):
         self._graphs[new_id] = graph
 
 
-clients = {}
-class WebSocketRuntimeApplication(geventwebsocket.WebSocketApplication):
+class _LazyWebSocketApplication(type):
     """
-    Web socket application that hosts a single ``Runtime`` instance.
-    An instance of this class receives messages over a websocket, delegates
-    message payloads to the appropriate ``Runtime`` methods, and sends
-    responses where applicable.
-    Message structures are defined by the FBP Protocol.
+    Metaclass of the stand-in for
+    ``rill.websocket.WebSocketRuntimeApplication``, which imports the real
+    class on first use.
     """
-    runtimes = {}
-
-    def __init__(self, ws):
-        super(WebSocketRuntimeApplication, self).__init__(ws)
-
-        self.logger = logging.getLogger('{}.{}'.format(
-            self.__class__.__module__, self.__class__.__name__))
-        self.runtime = self.runtimes[int(ws.environ['SERVER_PORT'])]
-
-        # FIXME: move to on_open?
-        # insert a listener
-        Connection.send = add_callback(Connection.send,
-                                       self.send_connection_data)
-
-    # WebSocketApplication overrides --
-
-    @staticmethod
-    def protocol_name():
-        """
-        WebSocket sub-protocol
-        """
-        return 'noflo'
-
-    def on_open(self):
-        self.client_id = uuid.uuid4()
-        print('connected: {}'.format(str(self.client_id)))
-        clients[self.client_id] = self
-        self.logger.info("Connection opened")
-
-    def on_close(self, reason):
-        del clients[self.client_id]
-        print('disconnected: {}'.format(str(self.client_id)))
-        self.client_id = None
-        self.logger.info("Connection closed. Reason: {}".format(reason))
-
-    def on_message(self, message, **kwargs):
-        self.logger.debug('MESSAGE: {}'.format(message))
-
-        if not message:
-            self.logger.warn('Got empty message')
-            return
-
-        m = json.loads(message)
-        dispatch = {
-            'runtime': self.handle_runtime,
-            'component': self.handle_component,
-            'graph': self.handle_graph,
-            'network': self.handle_network
-        }
-        import pprint
-        print("--IN--")
-        pprint.pprint(m)
-
-        try:
-            protocol = m['protocol']
-            command = m['command']
-            payload = m['payload']
-            message_id = m.get('id', None)
-        except KeyError:
-            # FIXME: send error?
-            self.logger.warn("Malformed message")
-            return
-
-        # FIXME: use the json-schema files from FBP protocol to validate
-        # message structure
-        try:
-            handler = dispatch[protocol]
-        except KeyError:
-            # FIXME: send error?
-            self.logger.warn("Subprotocol '{}' "
-                             "not supported".format(protocol))
-            return
-
+    def _load(cls):
         try:
-            handler(command, payload, message_id)
-        except RillRuntimeError as err:
-            self.send_error(protocol, str(err))
+            from rill.websocket import WebSocketRuntimeApplication
+        except ImportError as e:
+            raise ImportError(
+                "WebSocketRuntimeApplication requires geventwebsocket, which "
+                "could not be imported ({}). It now lives in "
+                "rill.websocket".format(e))
+        return WebSocketRuntimeApplication
 
-    # Utilities --
+    def __getattr__(cls, name):
+        return getattr(cls._load(), name)
 
-    def send(self, protocol, command, payload, message_id=None):
-        """
-        Send a message to UI/client
-        """
-        message = {'protocol': protocol,
-                   'command': command,
-                   'payload': payload,
-                   'id': message_id or str(uuid.uuid4())}
-        print("--OUT--")
-        import pprint
-        pprint.pprint(message)
-        # FIXME: what do we do when the socket closes or is dead?
-        try:
-            self.ws.send(json.dumps(message))
-        except geventwebsocket.WebSocketError as err:
-            print(err)
-
-    def send_error(self, protocol, message):
-        data = {
-            'message': message,
-            'stack': traceback.format_exc()
-        }
-        self.send(protocol, 'error', data)
+    def __call__(cls, *args, **kwargs):
+        return cls._load()(*args, **kwargs)
 
-    def send_connection_data(self, connection, packet, outport):
-        """
-        Setup as a callback for ``rill.engine.inputport.Connection.send``
-        so that packets sent by this method are intercepted and reported
-        to the UI/client.
-        """
-        inport = connection.inport
-        payload = {
-            'id': '{} {} -> {} {}'.format(
-                outport.component.get_name(),
-                outport._name,
-                inport._name,
-                inport.component.get_name(),
-            ),
-            'graph': 'main',  # FIXME
-            'src': {
-                'node': outport.component.get_name(),
-                'port': outport._name
-            },
-            'tgt': {
-                'node': inport.component.get_name(),
-                'port': inport._name
-            },
-            'data': packet.get_contents()
-        }
-        self.send('network', 'data', payload)
-
-    # Protocol send/responses --
-
-    def handle_runtime(self, command, payload, message_id):
-        # tell UI info about runtime and supported capabilities
-        if command == 'getruntime':
-            payload = self.runtime.get_runtime_meta()
-            # self.logger.debug(json.dumps(payload, indent=4))
-            self.send('runtime', 'runtime', payload)
-
-        # network:packet, allows sending data in/out to networks in this
-        # runtime can be used to represent the runtime as a FBP component
-        # in bigger system "remote subgraph"
-        elif command == 'packet':
-            # We don't actually run anything, just echo input back and
-            # pretend it came from "out"
-            payload['port'] = 'out'
-            self.send('runtime', 'packet', payload)
+    def __instancecheck__(cls, instance):
+        return isinstance(instance, cls._load())
 
-        else:
-            self.logger.warn("Unknown command '%s' for protocol '%s' " %
-                             (command, 'runtime'))
 
-    def handle_component(self, command, payload, message_id):
-        """
-        Provide information about components.
-        Parameters
-        ----------
-        command : str
-        payload : dict
-        """
-        if command == 'list':
-            for spec in self.runtime.get_all_component_specs():
-                self.send('component', 'component', spec)
-
-            self.send('component', 'componentsready', None)
-        # Get source code for component
-        elif command == 'getsource':
-            raise TypeError("HEREREREREHRERERE")
-            component_name = payload['name']
-            source_code = self.runtime.get_source_code(component_name)
-
-            library_name, short_component_name = component_name.split('/', 1)
-
-            payload = {
-                'name': short_component_name,
-                'language': 'python',
-                'library': library_name,
-                'code': source_code,
-                #'tests': ''
-                'secret': payload.get('secret')
-            }
-            self.send('component', 'source', payload)
-        else:
-            self.logger.warn("Unknown command '%s' for protocol '%s' " %
-                             (command, 'component'))
-
-    def handle_graph(self, command, payload, message_id):
-        """
-        Modify our graph representation to match that of the UI/client
-        Parameters
-        ----------
-        command : str
-        payload : dict
-        """
-        # Note: if it is possible for the graph state to be changed by
-        # other things than the client you must send a message on the
-        # same format, informing the client about the change
-        # Normally done using signals,observer-pattern or similar
-
-        send_ack = True
-
-        def get_graph():
-            try:
-                return payload['graph']
-            except KeyError:
-                raise RillRuntimeError('No graph specified')
-
-        def update_subnet(graph_id):
-            spec = self.runtime.register_subnet(graph_id)
-            self.send(
-                'component',
-                'component',
-                spec
-            )
-
-        try:
-            # New graph
-            if command == 'clear':
-                self.runtime.new_graph(
-                    payload['id'],
-                    payload.get('description', None),
-                    payload.get('metadata', None)
-                )
-            # Nodes
-            elif command == 'addnode':
-                self.runtime.add_node(get_graph(), payload['id'],
-                                      payload['component'],
-                                      payload.get('metadata', {}))
-            elif command == 'removenode':
-                self.runtime.remove_node(get_graph(), payload['id'])
-            elif command == 'renamenode':
-                self.runtime.rename_node(get_graph(), payload['from'],
-                                         payload['to'])
-            # Edges/connections
-            elif command == 'addedge':
-                metadata = self.runtime.add_edge(get_graph(), payload['src'],
-                                                 payload['tgt'],
-                                                 payload.get('metadata', {}))
-                # send an immedate followup to set the color based on type
-                send_ack = True
-                payload['metadata'] = metadata
-                self.send('graph', command, payload)
-                self.send('graph', 'changeedge', payload)
-            elif command == 'removeedge':
-                self.runtime.remove_edge(get_graph(), payload['src'],
-                                         payload['tgt'])
-            # IIP / literals
-            elif command == 'addinitial':
-                self.runtime.initialize_port(get_graph(), payload['tgt'],
-                                             payload['src']['data'])
-            elif command == 'removeinitial':
-                iip = self.runtime.uninitialize_port(get_graph(),
-                                                     payload['tgt'])
-                payload['src'] = {'data': iip}
-                # FIXME: hard-wiring metdata here to pass fbp-test
-                payload['metadata'] = {}
-            # Exported ports
-            elif command in ('addinport', 'addoutport'):
-                self.runtime.add_export(get_graph(), payload['node'],
-                                        payload['port'], payload['public'], payload['metadata'])
-                update_subnet(get_graph())
-            elif command == 'removeinport':
-                self.runtime.remove_inport(get_graph(), payload['public'])
-                update_subnet(get_graph())
-            elif command == 'removeoutport':
-                self.runtime.remove_outport(get_graph(), payload['public'])
-                update_subnet(get_graph())
-            elif command == 'changeinport':
-                self.runtime.change_inport(
-                    get_graph(), payload['public'], payload['metadata'])
-            elif command == 'changeoutport':
-                self.runtime.change_outport(
-                    get_graph(), payload['public'], payload['metadata'])
-            # Metadata changes
-            elif command == 'changenode':
-                metadata = self.runtime.set_node_metadata(get_graph(),
-                                                          payload['id'],
-                                                          payload['metadata'])
-                payload['metadata'] = metadata
-            elif command == 'changeedge':
-                metadata = self.runtime.set_edge_metadata(get_graph(),
-                                                          payload['src'],
-                                                          payload['tgt'],
-                                                          payload['metadata'])
-                payload['metadata'] = metadata
-            elif command == 'getgraph':
-                send_ack = False
-                graph_id = payload['id']
-                try:
-                    graph = self.runtime.get_graph(graph_id)
-                    graph_messages = get_graph_messages(
-                        graph, graph_id)
-                    for command, payload in graph_messages:
-                        self.send('graph', command, payload)
-                except RillRuntimeError as ex:
-                    self.runtime.new_graph(graph_id)
-
-            elif command == 'list':
-                send_ack = False
-                for graph_id in self.runtime._graphs.keys():
-                    self.send('graph', 'graph', {
-                        'id': graph_id
-                    })
-
-                self.send('graph', 'graphsdone', None)
-
-            elif command == 'changegraph':
-                send_ack = True
-                self.runtime.change_graph(
-                    get_graph(),
-                    payload.get('description', None),
-                    payload.get('metadata', None)
-                )
-
-            elif command == 'renamegraph':
-                send_ack = True
-                self.runtime.rename_graph(payload['from'], payload['to'])
-
-            else:
-                self.logger.warn("Unknown command '%s' for protocol '%s'" %
-                                 (command, 'graph'))
-                return
-        except FlowError as ex:
-            self.send_error('graph', str(ex))
-
-        # For any message we respected, send same in return as
-        # acknowledgement
-        if send_ack:
-            self.send('graph', command, payload)
-            print("CLIENTS: {}".format(len(clients.items())))
-            for client_id, client in clients.items():
-                if client_id != self.client_id:
-                    client.send('graph', command, payload, message_id)
-
-    def handle_network(self, command, payload, message_id):
-        """
-        Start / Stop and provide status messages about the network.
-        Parameters
-        ----------
-        command : str
-        payload : dict
-        """
-        def send_status(cmd, g, timestamp=True, broadcast=False):
-            started, running = self.runtime.get_status(g)
-            data = {
-                'graph': g,
-                'started': started,
-                'running': running,
-                # 'debug': True,
-            }
-            if timestamp:
-                data['time'] = datetime.datetime.now().isoformat()
-
-            self.send('network', cmd, data)
-            if broadcast:
-                for client_id, client in clients.items():
-                    if client_id != self.client_id:
-                        client.send('network', cmd, data)
-            # FIXME: hook up component logger to and output handler
-            # self.send('network', 'output', {'message': 'TEST!'})
-            # if started and running:
-            #     payload = {u'component': u'tests.components/GenerateTestData',
-            #   u'graph': u'575ed4de-39c9-3698-a4be-f5395d9eda2f',
-            #   u'id': u'tests.components/GenerateTestData_zoa2g',
-            #   u'metadata': {u'label': u'GenerateTestData',
-            #                 u'x': 334,
-            #                 u'y': 100},
-            #   u'secret': u'9129923'}
-            #     self.send('graph', 'addnode', payload)
-
-        graph_id = payload.get('graph', None)
-        if command == 'getstatus':
-            send_status('status', graph_id, timestamp=False)
-        elif command == 'start':
-            callback = functools.partial(
-                send_status, 'stopped', graph_id, broadcast=True)
-            self.runtime.start(graph_id, callback)
-            send_status('started', graph_id, broadcast=True)
-        elif command == 'stop':
-            self.runtime.stop(graph_id)
-            send_status('stopped', graph_id, broadcast=True)
-        elif command == 'debug':
-            self.runtime.set_debug(graph_id, payload['enable'])
-            self.send('network', 'debug', payload)
-        else:
-            self.logger.warn("Unknown command '%s' for protocol '%s'" %
-                             (command, 'network'))
+@add_metaclass(_LazyWebSocketApplication)
+class WebSocketRuntimeApplication(object):
+    """
+    Moved to ``rill.websocket``, so that importing this module does not import
+    geventwebsocket. This stand-in keeps the old import working: it imports
+    the real class on first use.
+    """
 
 
 # FIXME: do we need the host?
@@ -1101,6 +835,8 @@ def serve_runtime(runtime=None, host=DEFAULTS['host'], port=DEFAULTS['port'],
         This greenlet runs the websocket server that responds to remote commands
         that inspect/manipulate the Runtime.
         """
+        import geventwebsocket
+        from rill.websocket import WebSocketRuntimeApplication
         print('Runtime listening at {}'.format(address))
         WebSocketRuntimeApplication.runtimes[port] = runtime
         try:
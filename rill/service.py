@@ -0,0 +1,381 @@
+"""
+Serve a graph to many requests from a single, long-lived network.
+
+Building and starting a network for each request costs far more than
+running a packet through a warm one. ``GraphService`` instead starts the
+network once. Each request is sent to an exported inport as a packet whose
+attrs carry a request id, and responses are matched back to their requests
+by the id on the packets reaching an exported outport.
+
+The id must be carried from each request packet to the packets derived
+from it: components which forward packets keep it, and components which
+create new packets must copy it from their source packet (see the `source`
+argument of ``rill.engine.component.Component.create``). Few components do
+the latter, so responses without an id can instead be matched to requests
+by their order, when the service is told the graph sends one response per
+request in the order of the requests (``ordered=True``), or serves one
+request at a time (``max_concurrency=1``). Otherwise a response without an
+id cannot be matched to its request, so it stops the service with an error
+instead of being handed to the wrong caller.
+"""
+import json
+import time
+import logging
+import itertools
+from collections import deque
+
+import gevent
+from gevent.event import AsyncResult
+from gevent.lock import BoundedSemaphore, Semaphore
+from gevent.pool import Group
+from gevent.queue import Queue
+
+from rill.engine.component import Component
+from rill.engine.exceptions import FlowError
+from rill.engine.network import (Network, expand_parallelism,
+                                 _connect_temporarily,
+                                 _disconnect_temporarily, _get_exported_port,
+                                 _claim_graph, _release_graph)
+from rill.decorators import inport, outport
+from rill.compat import *
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID = 'request_id'
+
+
+@inport("REQUESTS", description="Iterable of (request id, content) pairs")
+@outport("OUT")
+class ServiceRequests(Component):
+    """
+    Send the content of each request, with its id in the packet's attrs.
+    """
+    def execute(self):
+        requests = self.ports.REQUESTS.receive_once()
+        if requests is None:
+            return
+        for request_id, content in requests:
+            packet = self.create(content)
+            packet.attrs[REQUEST_ID] = request_id
+            self.ports.OUT.send(packet)
+
+
+@inport("IN")
+@inport("RESPOND", description="Called with the request id and content of "
+                               "each response")
+class ServiceResponses(Component):
+    """
+    Pass the content of each packet to a callback, with its request id.
+    """
+    def execute(self):
+        respond = self.ports.RESPOND.receive_once()
+        for packet in self.ports.IN.iter_packets():
+            request_id = packet.attrs.get(REQUEST_ID)
+            respond(request_id, self.drop(packet))
+
+
+class GraphService(object):
+    """
+    Runs a graph in a persistent network, and sends requests through it.
+
+    Examples
+    --------
+    >>> service = GraphService(graph, max_concurrency=100)
+    >>> service.start()
+    >>> result = service.call({'name': 'value'})
+    >>> service.metrics()['latency']['p99']
+    """
+    def __init__(self, graph, inport=None, outport=None,
+                 initializations=None, max_concurrency=100,
+                 latency_samples=1000, ordered=False):
+        """
+        Parameters
+        ----------
+        graph : ``rill.engine.network.Graph``
+            the graph is owned by the service while it is running: running
+            it otherwise meanwhile raises ``FlowError``
+        inport : Optional[str]
+            name of the exported inport which receives requests. May be
+            omitted if the graph has only one
+        outport : Optional[str]
+            name of the exported outport which sends responses. May be
+            omitted if the graph has only one
+        initializations : Optional[Dict[str, Any]]
+            map of other exported inport names to initial content
+        max_concurrency : int
+            maximum number of requests in the network at once. Further calls
+            wait for a slot
+        latency_samples : int
+            number of recent request latencies kept for `metrics`
+        ordered : bool
+            the graph sends exactly one response per request, in the order
+            of the requests. Responses which have lost their request id are
+            then matched to requests by their order, as they also are when
+            `max_concurrency` is 1
+        """
+        self.initializations = initializations or {}
+        graph, _ = expand_parallelism(graph)
+        feed = graph.inports
+        if inport is None:
+            feed = dict((name, port) for name, port in feed.items()
+                        if name not in self.initializations)
+        self.inport = _get_exported_port(feed, inport, 'in')
+        self.outport = _get_exported_port(graph.outports, outport, 'out')
+        # requests and responses are attached to a shallow copy, but the
+        # ports of the graph itself are claimed while it runs
+        self._source_graph = graph
+        self.graph = graph.copy(deep=False)
+        self.max_concurrency = max_concurrency
+        self.ordered = ordered or max_concurrency == 1
+
+        self.network = None
+        self._requests = None
+        self._runner = None
+        self._components = None
+        self._ids = itertools.count()
+        # type: Dict[int, AsyncResult]
+        self._pending = {}
+        # ids of the requests sent but not yet responded to, in the order
+        # they were sent, to match responses by order
+        self._outstanding = deque()
+        self._slots = BoundedSemaphore(max_concurrency)
+        self._latencies = deque(maxlen=latency_samples)
+        self._counts = {'requests': 0, 'errors': 0, 'timeouts': 0,
+                        'unmatched': 0}
+
+    def start(self):
+        """
+        Start the network.
+        """
+        if self._runner is not None:
+            raise FlowError("Service is already running")
+        _claim_graph(self._source_graph, owner=self)
+        self._outstanding.clear()
+        graph = self.graph
+        self._requests = Queue()
+        requests = graph.add_component(
+            graph._get_unique_name('_ServiceRequests'), ServiceRequests,
+            REQUESTS=self._requests)
+        responses = graph.add_component(
+            graph._get_unique_name('_ServiceResponses'), ServiceResponses,
+            RESPOND=self._respond)
+        self._components = (requests, responses)
+        _connect_temporarily(requests.port('OUT'), graph.inports[self.inport],
+                             graph.default_capacity)
+        _connect_temporarily(graph.outports[self.outport],
+                             responses.port('IN'), graph.default_capacity)
+        for (port_name, content) in self.initializations.items():
+            graph.inports[port_name].initialize(content)
+
+        # the network waits on the request queue between requests, so it must
+        # not mistake being idle for a deadlock
+        self.network = Network(graph, deadlock_test_interval=None)
+        self._runner = gevent.spawn(self.network.go)
+        self._runner.link(self._stopped)
+
+    def stop(self, timeout=5):
+        """
+        Stop accepting requests, let those in flight finish, and stop the
+        network.
+
+        Parameters
+        ----------
+        timeout : Optional[float]
+            seconds to wait for requests in flight before the network is
+            terminated
+        """
+        if self._runner is None:
+            return
+        # ends the iteration over the queue, which closes the network's inport
+        self._requests.put(StopIteration)
+        self._runner.join(timeout)
+        if not self._runner.ready():
+            self.network.terminate()
+            gevent.killall(self.network.runners)
+            self._runner.kill()
+
+        graph = self.graph
+        requests, responses = self._components
+        for port_name in self.initializations:
+            graph.inports[port_name].uninitialize()
+        _disconnect_temporarily(requests.port('OUT'),
+                                graph.inports[self.inport])
+        _disconnect_temporarily(graph.outports[self.outport],
+                                responses.port('IN'))
+        graph.remove_component(requests.get_name())
+        graph.remove_component(responses.get_name())
+        self._runner = None
+        _release_graph(self._source_graph)
+
+    @property
+    def running(self):
+        return self._runner is not None and not self._runner.ready()
+
+    def call(self, content, timeout=None):
+        """
+        Send a request through the network and wait for its response.
+
+        Parameters
+        ----------
+        content : Any
+        timeout : Optional[float]
+            seconds to wait for the response, including the wait for a free
+            slot
+
+        Returns
+        -------
+        Any
+            the content of the first packet sent by the outport for this
+            request
+        """
+        if not self.running:
+            raise FlowError("Service is not running")
+        start = time.time()
+        if not self._slots.acquire(timeout=timeout):
+            self._counts['timeouts'] += 1
+            raise gevent.Timeout(timeout)
+        request_id = next(self._ids)
+        result = self._pending[request_id] = AsyncResult()
+        try:
+            self._counts['requests'] += 1
+            if self.ordered:
+                # kept after a timeout, until the late response is received
+                self._outstanding.append(request_id)
+            self._requests.put((request_id, content))
+            if timeout is not None:
+                timeout = max(timeout - (time.time() - start), 0)
+            try:
+                response = result.get(timeout=timeout)
+            except gevent.Timeout:
+                self._counts['timeouts'] += 1
+                raise
+            except Exception:
+                self._counts['errors'] += 1
+                raise
+        finally:
+            self._pending.pop(request_id, None)
+            self._slots.release()
+        self._latencies.append(time.time() - start)
+        return response
+
+    def _respond(self, request_id, content):
+        if request_id is None and self.ordered and self._outstanding:
+            request_id = self._outstanding.popleft()
+        elif request_id is None:
+            self._counts['unmatched'] += 1
+            if self.ordered:
+                logger.warning("Unmatched response: no requests are "
+                               "outstanding")
+                return
+            raise FlowError(
+                "Response {!r} has no request id: a component between the "
+                "service's inport and outport did not copy the attrs of its "
+                "source packet. If the graph responds to requests in order, "
+                "serve it with ordered=True".format(content))
+        elif self.ordered:
+            try:
+                self._outstanding.remove(request_id)
+            except ValueError:
+                pass
+        result = self._pending.pop(request_id, None)
+        if result is None:
+            # the request timed out or was already answered
+            self._counts['unmatched'] += 1
+            logger.warning("Unmatched response for request {}".format(
+                request_id))
+            return
+        result.set(content)
+
+    def _stopped(self, runner):
+        if runner.successful():
+            error = FlowError("Service stopped")
+        else:
+            error = runner.exception
+        for result in list(self._pending.values()):
+            result.set_exception(error)
+        self._pending.clear()
+
+    def metrics(self):
+        """
+        Get request counts and the latency of recent requests.
+
+        Returns
+        -------
+        Dict[str, Any]
+            latencies are in seconds
+        """
+        metrics = dict(self._counts)
+        metrics['in_flight'] = len(self._pending)
+        latencies = sorted(self._latencies)
+        if latencies:
+            def percentile(p):
+                return latencies[min(int(len(latencies) * p),
+                                     len(latencies) - 1)]
+            metrics['latency'] = {
+                'mean': sum(latencies) / len(latencies),
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'p99': percentile(0.99),
+                'max': latencies[-1],
+            }
+        else:
+            metrics['latency'] = None
+        return metrics
+
+    def serve(self, path):
+        """
+        Serve requests on a unix socket until the server is stopped.
+
+        The protocol is json lines: each request is ``{"id": ..., "payload":
+        ...}``, and is answered with the same id and either a ``payload`` or
+        an ``error``. Requests on one connection are handled concurrently,
+        so responses may arrive out of order.
+
+        Parameters
+        ----------
+        path : str
+
+        Returns
+        -------
+        ``gevent.server.StreamServer``
+            the started server
+        """
+        import os
+        from gevent import socket
+        from gevent.server import StreamServer
+
+        if os.path.exists(path):
+            os.unlink(path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(128)
+        server = StreamServer(listener, self._handle)
+        server.start()
+        return server
+
+    def _handle(self, sock, address):
+        lock = Semaphore()
+
+        def reply(message):
+            data = json.dumps(message).encode('utf-8') + b'\n'
+            with lock:
+                sock.sendall(data)
+
+        def answer(message):
+            response = {'id': message.get('id')}
+            try:
+                response['payload'] = self.call(message.get('payload'))
+            except Exception as e:
+                response['error'] = '{}: {}'.format(type(e).__name__, e)
+            reply(response)
+
+        answers = Group()
+        for line in sock.makefile('rb'):
+            try:
+                message = json.loads(line.decode('utf-8'))
+            except ValueError as e:
+                reply({'id': None, 'error': 'Invalid request: {}'.format(e)})
+                continue
+            answers.spawn(answer, message)
+        answers.join()
+        sock.close()
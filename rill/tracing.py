@@ -0,0 +1,168 @@
+"""
+Sampled, rate limited tracing of the packets sent over connections, for
+inspecting edges of a running network from the UI.
+"""
+import json
+import random
+import time
+
+from rill.compat import *
+
+
+class _EdgeStats(object):
+    __slots__ = ('tokens', 'updated', 'window_start', 'packets', 'traced')
+
+    def __init__(self, now, tokens):
+        self.tokens = tokens
+        self.updated = now
+        self.window_start = now
+        # packets sent, and packets traced, in the current window
+        self.packets = 0
+        self.traced = 0
+
+
+class EdgeTracer(object):
+    """
+    Decides which packets sent over a connection are reported, and builds
+    ``network:data`` payloads for them.
+
+    Each edge is limited to `max_rate` traced packets per second, and only a
+    `sample_rate` fraction of its packets are considered. Packets which are
+    not traced are counted instead, and every `summary_interval` seconds an
+    edge which dropped packets is reported with a summary of its throughput
+    in place of packet contents.
+
+    The settings can be overridden for a single edge with the edge metadata
+    keys ``sample_rate`` and ``max_rate``.
+    """
+
+    def __init__(self, send, sample_rate=1.0, max_rate=10.0,
+                 max_length=256, summary_interval=1.0, graph_id='main'):
+        """
+        Parameters
+        ----------
+        send : Callable[[dict], None]
+            called with each ``network:data`` payload
+        sample_rate : float
+            fraction of packets considered for tracing
+        max_rate : float
+            maximum number of packets traced per edge per second
+        max_length : int
+            string packet contents longer than this are truncated. Other
+            contents whose json is longer are replaced by their truncated
+            repr
+        summary_interval : float
+            number of seconds between summaries of an edge
+        graph_id : str
+        """
+        self.send = send
+        self.sample_rate = sample_rate
+        self.max_rate = max_rate
+        self.max_length = max_length
+        self.summary_interval = summary_interval
+        self.graph_id = graph_id
+        # map of (connection, outport) to stats
+        # type: Dict[Tuple[Connection, OutputPort], _EdgeStats]
+        self._stats = {}
+
+    def trace(self, connection, packet, outport):
+        """
+        Called for each packet sent over `connection`.
+
+        Parameters
+        ----------
+        connection : ``rill.engine.inputport.Connection``
+        packet : ``rill.engine.packet.Packet``
+        outport : ``rill.engine.outputport.OutputPort``
+        """
+        metadata = connection.metadata.get(outport, {})
+        max_rate = metadata.get('max_rate', self.max_rate)
+        now = time.time()
+        key = (connection, outport)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = _EdgeStats(now, max_rate)
+        stats.packets += 1
+
+        # refill the token bucket
+        stats.tokens = min(max_rate,
+                           stats.tokens + (now - stats.updated) * max_rate)
+        stats.updated = now
+
+        sample_rate = metadata.get('sample_rate', self.sample_rate)
+        if stats.tokens >= 1 and \
+                (sample_rate >= 1 or random.random() < sample_rate):
+            stats.tokens -= 1
+            stats.traced += 1
+            self.send(self._payload(connection, outport,
+                                    self._truncate(packet.get_contents())))
+
+        if now - stats.window_start >= self.summary_interval:
+            self._summarize(connection, outport, stats, now)
+
+    def flush(self):
+        """
+        Report the summaries of all edges which dropped packets, and forget
+        all edges.
+
+        Call this when the traced network stops, so that its connections are
+        not kept alive by the tracer.
+        """
+        now = time.time()
+        for (connection, outport), stats in list(self._stats.items()):
+            self._summarize(connection, outport, stats, now)
+        self._stats.clear()
+
+    def _summarize(self, connection, outport, stats, now):
+        dropped = stats.packets - stats.traced
+        if dropped:
+            elapsed = max(now - stats.window_start, 1e-6)
+            summary = {
+                'packets': stats.packets,
+                'traced': stats.traced,
+                'seconds': elapsed,
+                'rate': stats.packets / elapsed,
+            }
+            text = '<{packets} packets, {rate:.0f}/s>'.format(**summary)
+            payload = self._payload(connection, outport, text)
+            payload['summary'] = summary
+            self.send(payload)
+        stats.window_start = now
+        stats.packets = 0
+        stats.traced = 0
+
+    def _truncate(self, data):
+        if isinstance(data, basestring):
+            text = data
+        else:
+            try:
+                if len(json.dumps(data)) <= self.max_length:
+                    return data
+            except (TypeError, ValueError):
+                pass
+            # too long, or not serializable: report the repr instead
+            text = repr(data)
+        if len(text) > self.max_length:
+            return text[:self.max_length] + '...'
+        return text
+
+    def _payload(self, connection, outport, data):
+        inport = connection.inport
+        return {
+            'id': '{} {} -> {} {}'.format(
+                outport.component.get_name(),
+                outport._name,
+                inport._name,
+                inport.component.get_name(),
+            ),
+            'graph': self.graph_id,
+            'src': {
+                'node': outport.component.get_name(),
+                'port': outport._name
+            },
+            'tgt': {
+                'node': inport.component.get_name(),
+                'port': inport._name
+            },
+            'data': data
+        }
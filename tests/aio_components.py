@@ -0,0 +1,37 @@
+"""
+Components written as ``async def`` functions. Python 3.5+ only.
+"""
+import asyncio
+
+from rill import *
+from rill.engine import aio
+
+
+@component
+@inport("IN")
+@inport("PRE", type=str)
+@outport("OUT", type=str)
+async def AsyncPrefix(IN, PRE, OUT):
+    """Prefix each packet IN with PRE, yielding between packets"""
+    prefix = await PRE.receive_once()
+    async for content in IN.iter_contents():
+        await aio.sleep(0.001)
+        await OUT.send(prefix + content)
+
+
+@component
+@inport("IN", array=True)
+@outport("OUT")
+async def AsyncConcatenate(IN, OUT):
+    """Concatenate streams, awaiting each element port in turn"""
+    for inport in IN:
+        async for p in inport:
+            await asyncio.sleep(0)
+            await OUT.send(p)
+
+
+@component
+@outport("OUT")
+async def AwaitsEventLoop(OUT):
+    """Await a future, which requires a running event loop"""
+    await asyncio.Future(loop=asyncio.new_event_loop())
@@ -1,6 +1,6 @@
 import re
 from rill import *
-from rill.fn import range
+from rill.fn import range, synced, forked
 from schematics.models import Model
 from schematics.types import StringType, IntType, ModelType, ListType
 
@@ -243,3 +243,39 @@ def GenerateRandom(COUNT, OUT):
     for i in range(count):
         OUT.send(random())
 
+
+@component
+@inport("IN", array=True)
+@inport("SIZE", type=int, required=True)
+@outport("OUT", type=list)
+def GroupBatches(IN, SIZE, OUT):
+    """Send lists of up to SIZE synchronized tuples"""
+    size = SIZE.receive_once()
+    inports = synced(IN)
+    while True:
+        batch = inports.receive_batch(size)
+        if not batch:
+            break
+        OUT.send([tuple(p.drop() for p in group) for group in batch])
+
+
+@component
+@inport("IN")
+@outport("OUT", array=True)
+def Fork(IN, OUT):
+    """Send a copy of each packet to every element of OUT"""
+    outports = forked(OUT)
+    for p in IN:
+        outports.send(p)
+        p.drop()
+
+
+@component(pass_context=True)
+@inport("IN")
+@inport("LOG", description="List to append (component name, contents) to")
+def Log(self, IN, LOG):
+    """Record received packets in a shared list"""
+    log = LOG.receive_once()
+    for p in IN:
+        log.append((self.name, p.get_contents()))
+        p.drop()
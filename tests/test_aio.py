@@ -0,0 +1,95 @@
+import sys
+
+import pytest
+
+import rill.engine.utils
+from rill.engine.exceptions import FlowError
+from rill.engine.network import Graph, run_graph
+from rill.engine.types import Stream
+
+from tests.components import *
+
+if sys.version_info < (3, 5):
+    pytest.skip("async components require python 3.5+",
+                allow_module_level=True)
+
+import asyncio
+
+from rill.engine.aio import run_graph_async
+from tests.aio_components import *
+
+rill.engine.utils.patch()
+
+
+def test_async_component():
+    graph = Graph()
+    graph.add_component("Prefix", AsyncPrefix, PRE='x',
+                        IN=Stream(['a', 'b', 'c']))
+    dis = graph.add_component("Discard", DiscardLooper)
+    graph.connect("Prefix.OUT", "Discard.IN")
+    run_graph(graph)
+    assert dis.values == ['xa', 'xb', 'xc']
+
+
+def test_async_component_array():
+    graph = Graph()
+    graph.add_component("Concat", AsyncConcatenate)
+    graph.initialize(Stream([1, 2]), "Concat.IN[0]")
+    graph.initialize(Stream([3]), "Concat.IN[1]")
+    dis = graph.add_component("Discard", DiscardLooper)
+    graph.connect("Concat.OUT", "Discard.IN")
+    run_graph(graph)
+    assert dis.values == [1, 2, 3]
+
+
+def test_async_component_event_loop_error():
+    graph = Graph()
+    graph.add_component("Wait", AwaitsEventLoop)
+    with pytest.raises(FlowError):
+        run_graph(graph)
+
+
+def test_run_graph_async():
+    graph = Graph()
+    graph.add_component("Prefix", AsyncPrefix, PRE='x')
+    graph.export("Prefix.IN", "IN")
+    graph.export("Prefix.OUT", "OUT")
+
+    loop = asyncio.new_event_loop()
+    try:
+        result = loop.run_until_complete(
+            run_graph_async(graph, {'IN': 'a'}, capture_results=True,
+                            loop=loop))
+    finally:
+        loop.close()
+    assert result == {'OUT': 'xa'}
+
+
+def test_run_graph_async_unpatched():
+    # patching is process-wide and this module patches, so run in a fresh
+    # interpreter which never does
+    import os
+    import subprocess
+    script = """
+import asyncio
+import gevent.monkey
+from rill.engine.network import Graph
+from rill.engine.aio import run_graph_async
+from rill.engine.types import Stream
+from tests.aio_components import AsyncPrefix
+from tests.components import Passthru, Discard
+
+graph = Graph()
+graph.add_component("Prefix", AsyncPrefix, PRE='x', IN=Stream(['a', 'b']))
+graph.add_component("Pass", Passthru)
+dis = graph.add_component("Discard", Discard)
+graph.connect("Prefix.OUT", "Pass.IN")
+graph.connect("Pass.OUT", "Discard.IN")
+loop = asyncio.new_event_loop()
+loop.run_until_complete(asyncio.wait_for(run_graph_async(graph, loop=loop), 10))
+print(gevent.monkey.is_module_patched('threading'), *dis.values)
+"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, '-c', script],
+                                     cwd=root, timeout=30)
+    assert output.decode('utf-8').split()[-3:] == ['False', 'xa', 'xb']
@@ -1,3 +1,5 @@
+import operator
+
 import pytest
 
 import gevent.monkey
@@ -6,26 +8,36 @@ import gevent
 import rill.engine.utils
 rill.engine.utils.patch()
 
+from rill.compat import PY2
 from rill.engine.exceptions import FlowError
-from rill.engine.network import Network, Graph, run_graph
+from rill.engine.network import (Network, Graph, iter_graph, run_graph,
+                                 expand_parallelism)
 from rill.engine.outputport import OutputPort
 from rill.engine.inputport import InputPort
 from rill.engine.runner import ComponentRunner
 from rill.engine.port import OUT_NULL, IN_NULL
 from rill.engine.component import Component
+from rill.engine.packet import Packet
+from rill.engine.types import Stream
+from rill.engine.subnet import make_subgraph
 from rill.decorators import inport, outport, component, subnet
 
 from tests.utils import names
 from tests.components import *
 from tests.subnets import PassthruNet
 
-from rill.components.basic import Counter, Sort, Inject, Repeat, Cap, Kick
+from rill.components.basic import (Counter, Sort, Inject, Repeat, Cap, Kick,
+                                  ExternalSort, TopK, WindowedSort, Capture)
 from rill.components.filters import First
-from rill.components.merge import Group
-from rill.components.split import RoundRobinSplit, Replicate
+from rill.components.merge import Group, OrderedMerge, SubstreamSensitiveMerge
+from rill.components.split import (RoundRobinSplit, Replicate, LoadBalance,
+                                  PartitionByKey)
 from rill.components.math import Add
-from rill.components.files import ReadLines, WriteLines, Write
-from rill.components.timing import SlowPass
+from rill.components.aggregate import GroupBy
+from rill.components.parallel import ParallelMap
+from rill.components.files import ReadLines, WriteLines, Write, ReadFiles
+from rill.components.timing import (SlowPass, TumblingWindow, SlidingWindow,
+                                   SessionWindow)
 from rill.components.text import Prefix, LineToWords, LowerCase, StartsWith, WordsToLine
 
 import logging
@@ -385,6 +397,62 @@ def test_null_ports2(graph, tmpdir, discard):
     assert dis.values == ['000002', '000001']
 
 
+@pytest.mark.parametrize('ordered', [True, False])
+def test_read_files(graph, tmpdir, discard, ordered):
+    for i in range(3):
+        tmpdir.join('file{}.txt'.format(i)).write('a{0}\nb{0}\n'.format(i))
+    tmpdir.join('other.dat').write('ignored\n')
+    graph.add_component("Read", ReadFiles,
+                        PATTERN=str(tmpdir.join('*.txt')), CONCURRENCY=2,
+                        ORDERED=ordered)
+    dis = graph.add_component("Discard", discard)
+    graph.connect("Read.OUT", "Discard.IN")
+    run_graph(graph)
+
+    brackets = [p.get_type() for p in dis.packets
+                if p.get_type() != Packet.Type.NORMAL]
+    assert brackets == [Packet.Type.OPEN, Packet.Type.CLOSE] * 3
+    lines = [v for v in dis.values if v]
+    if ordered:
+        assert lines == ['a0', 'b0', 'a1', 'b1', 'a2', 'b2']
+    else:
+        assert sorted(lines) == ['a0', 'a1', 'a2', 'b0', 'b1', 'b2']
+
+
+def test_read_files_in_chunks(graph, tmpdir, discard):
+    # each file is larger than a chunk
+    for i in range(2):
+        tmpdir.join('file{}.txt'.format(i)).write(
+            ''.join('{}-{:01000d}\n'.format(i, j) for j in range(150)))
+    graph.add_component("Read", ReadFiles, PATTERN=str(tmpdir),
+                        CONCURRENCY=1)
+    dis = graph.add_component("Discard", discard)
+    graph.connect("Read.OUT", "Discard.IN")
+    run_graph(graph)
+
+    expected = []
+    for i in range(2):
+        expected += [''] + ['{}-{:01000d}'.format(i, j)
+                            for j in range(150)] + ['']
+    assert dis.values == expected
+
+
+@pytest.mark.skipif(PY2, reason="files are read as bytes on python 2")
+@pytest.mark.parametrize('ordered', [True, False])
+def test_read_files_undecodable(graph, tmpdir, discard, ordered):
+    tmpdir.join('file0.txt').write('a0\n')
+    tmpdir.join('file1.txt').write(b'\xff\xfe\xfa\n', mode='wb')
+    graph.add_component("Read", ReadFiles, PATTERN=str(tmpdir),
+                        ORDERED=ordered)
+    dis = graph.add_component("Discard", discard)
+    graph.connect("Read.OUT", "Discard.IN")
+    # the error reaches the network, rather than leaving it waiting for the
+    # file's lines
+    with gevent.Timeout(5):
+        with pytest.raises(UnicodeDecodeError):
+            run_graph(graph)
+
+
 def test_inport_closed(graph, discard):
     graph.add_component("Generate", GenerateTestData, COUNT=5)
     graph.add_component("First", First)
@@ -472,6 +540,26 @@ def test_synced_receive3(graph, discard):
     assert dis.values == []
 
 
+def test_synced_receive_batch(graph, discard):
+    graph.add_component("Generate5", GenerateTestData, COUNT=5)
+    graph.add_component("Generate4", GenerateTestData, COUNT=4)
+    graph.add_component("Merge", GroupBatches, SIZE=3)
+    dis = graph.add_component("Discard", discard)
+
+    graph.connect("Generate5.OUT", "Merge.IN[0]")
+    graph.connect("Generate4.OUT", "Merge.IN[1]")
+    graph.initialize('initial', "Merge.IN[2]")
+    graph.connect("Merge.OUT", "Discard.IN")
+    run_graph(graph)
+
+    assert dis.values == [
+        [('000005', '000004', 'initial'),
+         ('000004', '000003', 'initial'),
+         ('000003', '000002', 'initial')],
+        [('000002', '000001', 'initial')],
+    ]
+
+
 def test_merge_sort_drop(graph, discard):
     graph.add_component("_Generate", GenerateTestData, COUNT=4)
     graph.add_component("_Generate2", GenerateTestData, COUNT=4)
@@ -491,6 +579,421 @@ def test_merge_sort_drop(graph, discard):
     ]
 
 
+@pytest.mark.parametrize('buffer', [1, 1000000])
+def test_external_sort(graph, discard, buffer):
+    graph.add_component("Generate", GenerateTestData, COUNT=20)
+    graph.add_component("Sort", ExternalSort, BUFFER=buffer * 100,
+                        KEY=lambda s: -int(s[-1]))
+    dis = graph.add_component("Discard", discard)
+    graph.connect("Generate.OUT", "Sort.IN")
+    graph.connect("Sort.OUT", "Discard.IN")
+    run_graph(graph)
+    expected = sorted(('%06d' % i for i in range(20, 0, -1)),
+                      key=lambda s: -int(s[-1]))
+    assert dis.values == expected
+
+
+@pytest.mark.parametrize('largest', [False, True])
+def test_top_k(graph, discard, largest):
+    graph.add_component("Generate", GenerateTestData, COUNT=10)
+    graph.add_component("TopK", TopK, K=3, LARGEST=largest)
+    dis = graph.add_component("Discard", discard)
+    graph.connect("Generate.OUT", "TopK.IN")
+    graph.connect("TopK.OUT", "Discard.IN")
+    run_graph(graph)
+    if largest:
+        assert dis.values == ['000010', '000009', '000008']
+    else:
+        assert dis.values == ['000001', '000002', '000003']
+
+
+def test_windowed_sort(graph, discard):
+    # every value is at most 2 positions from its sorted position
+    graph.add_component("Sort", WindowedSort, SIZE=2,
+                        IN=Stream([2, 1, 3, 5, 4, 7, 6, 8, 9]))
+    dis = graph.add_component("Discard", discard)
+    graph.connect("Sort.OUT", "Discard.IN")
+    run_graph(graph)
+    assert dis.values == [1, 2, 3, 4, 5, 6, 7, 8, 9]
+
+
+@pytest.mark.parametrize('reducer,expected', [
+    ('count', [('a', 3), ('b', 2)]),
+    ('sum', [('a', 8), ('b', 6)]),
+    ('max', [('a', 5), ('b', 4)]),
+    ('collect', [('a', [1, 2, 5]), ('b', [2, 4])]),
+])
+def test_group_by(graph, discard, reducer, expected):
+    data = [('a', 1), ('b', 2), ('a', 2), ('b', 4), ('a', 5)]
+    graph.add_component("GroupBy", GroupBy, IN=Stream(data),
+                        KEY=lambda x: x[0], VALUE=lambda x: x[1],
+                        REDUCER=reducer)
+    dis = graph.add_component("Discard", discard)
+    graph.connect("GroupBy.OUT", "Discard.IN")
+    run_graph(graph)
+    assert sorted(dis.values) == expected
+
+
+def test_group_by_flush_size(graph, discard):
+    graph.add_component("GroupBy", GroupBy, IN=Stream('aabbcc'), FLUSH_SIZE=2)
+    dis = graph.add_component("Discard", discard)
+    graph.connect("GroupBy.OUT", "Discard.IN")
+    run_graph(graph)
+    assert dis.values[:2] in ([('a', 2), ('b', 1)], [('b', 1), ('a', 2)])
+    assert sorted(dis.values[2:]) == [('b', 1), ('c', 1), ('c', 1)]
+
+
+def test_group_by_flush_interval_while_idle():
+    graph = Graph()
+    graph.add_component("GroupBy", GroupBy, FLUSH_INTERVAL=0.05)
+    graph.export("GroupBy.IN", "IN")
+    graph.export("GroupBy.OUT", "OUT")
+    received = []
+
+    def idle_input():
+        yield 'a'
+        yield 'a'
+        gevent.sleep(0.3)
+        # flushed on time, without waiting for another packet
+        assert received == [('a', 2)]
+        yield 'b'
+
+    for result in iter_graph(graph, idle_input()):
+        received.append(result)
+    assert received == [('a', 2), ('b', 1)]
+
+
+def test_tumbling_window(graph, discard):
+    graph.add_component("Window", TumblingWindow, SIZE=10, COUNT=3,
+                        TIMESTAMP=lambda x: x,
+                        IN=Stream([1, 2, 5, 12, 15, 16, 17, 18, 31]))
+    dis = graph.add_component("Discard", discard)
+    graph.connect("Window.OUT", "Discard.IN")
+    run_graph(graph)
+    assert dis.values == [[1, 2, 5], [12, 15, 16], [17, 18], [31]]
+
+
+def test_sliding_window(graph, discard):
+    graph.add_component("Window", SlidingWindow, SIZE=10, SLIDE=5,
+                        TIMESTAMP=lambda x: x, IN=Stream([1, 6, 7, 12, 26]))
+    dis = graph.add_component("Discard", discard)
+    graph.connect("Window.OUT", "Discard.IN")
+    run_graph(graph)
+    assert dis.values == [[1], [1, 6, 7], [6, 7, 12], [12], [26], [26]]
+
+
+def test_session_window(graph, discard):
+    graph.add_component("Window", SessionWindow, GAP=3,
+                        TIMESTAMP=lambda x: x, IN=Stream([1, 2, 5, 9, 10, 20]))
+    dis = graph.add_component("Discard", discard)
+    graph.connect("Window.OUT", "Discard.IN")
+    run_graph(graph)
+    assert dis.values == [[1, 2, 5], [9, 10], [20]]
+
+
+def test_session_window_arrival_time(graph, discard):
+    graph.add_component("Generate", GenerateTestData, COUNT=4)
+    graph.add_component("Pass", SlowPass, DELAY=0.05)
+    graph.add_component("Window", SessionWindow, GAP=0.5)
+    dis = graph.add_component("Discard", discard)
+    graph.connect("Generate.OUT", "Pass.IN")
+    graph.connect("Pass.OUT", "Window.IN")
+    graph.connect("Window.OUT", "Discard.IN")
+    run_graph(graph)
+    assert dis.values == [['000004', '000003', '000002', '000001']]
+
+
+def test_window_timeout_loses_no_packets(graph, discard):
+    # windows time out constantly, while each receive may also yield for the
+    # budget
+    graph.add_component("Generate", GenerateTestData, COUNT=300)
+    graph.add_component("Window", TumblingWindow, SIZE=0.0005)
+    dis = graph.add_component("Discard", discard)
+    graph.connect("Generate.OUT", "Window.IN")
+    graph.connect("Window.OUT", "Discard.IN")
+    Network(graph, yield_budget=1).go()
+    assert sum(len(window) for window in dis.values) == 300
+
+
+def _slow_negate(x):
+    # later items finish first
+    gevent.sleep(0.01 * (5 - x))
+    return -x
+
+
+@pytest.mark.parametrize('mode', ['greenlet', 'thread', 'process'])
+@pytest.mark.parametrize('ordered', [True, False])
+def test_parallel_map(graph, discard, mode, ordered):
+    # functions must be picklable to be sent to a process
+    func = _slow_negate if mode == 'greenlet' else operator.neg
+    graph.add_component("Map", ParallelMap, FUNC=func, WORKERS=3, MODE=mode,
+                        ORDERED=ordered, IN=Stream([0, 1, 2, 3, 4]))
+    dis = graph.add_component("Discard", discard)
+    graph.connect("Map.OUT", "Discard.IN")
+    run_graph(graph)
+    if ordered:
+        assert dis.values == [0, -1, -2, -3, -4]
+    else:
+        assert sorted(dis.values) == [-4, -3, -2, -1, 0]
+
+
+def test_parallel_map_sends_results_while_input_is_idle():
+    graph = Graph()
+    graph.add_component("Map", ParallelMap, FUNC=operator.neg,
+                        MODE='greenlet')
+    graph.export("Map.IN", "IN")
+    graph.export("Map.OUT", "OUT")
+    received = []
+
+    def slow_input():
+        for i in range(3):
+            yield i
+            gevent.sleep(0.05)
+            # the result was sent without waiting for the next input
+            assert received == [-x for x in range(i + 1)]
+
+    for result in iter_graph(graph, slow_input()):
+        received.append(result)
+    assert received == [0, -1, -2]
+
+
+def test_parallelism_metadata(graph, discard):
+    gen = graph.add_component("Generate", GenerateTestData, COUNT=10)
+    pre = graph.add_component("Prefix", Prefix, PRE='x')
+    graph.add_component("Discard", discard)
+    graph.connect("Generate.OUT", "Prefix.IN")
+    graph.connect("Prefix.OUT", "Discard.IN")
+    graph.set_node_metadata(pre, {'parallelism': 3})
+
+    # the graph must be expanded before the network is created
+    with pytest.raises(FlowError):
+        Network(graph)
+
+    expanded, replicas = expand_parallelism(graph)
+    assert expanded is not graph
+    assert replicas == {'Prefix': ['Prefix_0', 'Prefix_1', 'Prefix_2']}
+    assert set(expanded.get_components()) == {
+        'Generate', 'Prefix_split', 'Prefix_0', 'Prefix_1', 'Prefix_2',
+        'Prefix_OUT_merge', 'Discard'}
+    Network(expanded).go()
+    dis = expanded.component('Discard')
+    assert sorted(dis.values) == ['x%06d' % i for i in range(1, 11)]
+
+    # the original graph is untouched
+    assert 'Prefix' in graph.get_components()
+    assert gen.ports.OUT._connections[0].inport is pre.ports.IN
+
+
+def test_parallelism_metadata_exported_ports():
+    graph = Graph()
+    pre = graph.add_component("Prefix", Prefix, PRE='x')
+    graph.set_node_metadata(pre, {'parallelism': 2})
+    graph.export("Prefix.IN", "IN")
+    graph.export("Prefix.OUT", "OUT")
+
+    results = run_graph(graph, {'IN': Stream(['a', 'b', 'c'])},
+                        capture_results=True)
+    assert results['OUT'] in ('xa', 'xb', 'xc')
+    assert list(iter_graph(graph, ['a', 'b'])) in (['xa', 'xb'],
+                                                  ['xb', 'xa'])
+
+    # exported ports within a subgraph
+    sub = make_subgraph('ParallelPrefix', graph)
+    outer = Graph()
+    outer.add_component("Generate", GenerateTestData, COUNT=4)
+    outer.add_component("Sub", sub)
+    capture = outer.add_component("Capture", Capture)
+    outer.connect("Generate.OUT", "Sub.IN")
+    outer.connect("Sub.OUT", "Capture.IN")
+    run_graph(outer)
+    assert capture.value.startswith('x00000')
+
+
+def test_parallelism_metadata_multiple_streams(graph):
+    graph.add_component("Generate", GenerateTestData, COUNT=1)
+    graph.add_component("Generate2", GenerateTestData, COUNT=1)
+    add = graph.add_component("Add", Add)
+    graph.connect("Generate.OUT", "Add.IN1")
+    graph.connect("Generate2.OUT", "Add.IN2")
+    graph.set_node_metadata(add, {'parallelism': 2})
+    with pytest.raises(FlowError):
+        expand_parallelism(graph)
+
+
+@pytest.mark.parametrize('choices', [None, 2])
+def test_load_balance(graph, discard, choices):
+    graph.add_component("Split", LoadBalance, IN=Stream(list(range(20))),
+                        CHOICES=choices)
+    dis = []
+    for i in range(4):
+        graph.add_component("Pass%d" % i, SlowPass, DELAY=0.001)
+        dis.append(graph.add_component("Discard%d" % i, discard))
+        graph.connect("Split.OUT[%d]" % i, "Pass%d.IN" % i)
+        graph.connect("Pass%d.OUT" % i, "Discard%d.IN" % i)
+    run_graph(graph)
+    assert sorted(sum([d.values for d in dis], [])) == list(range(20))
+    if choices is None:
+        # workers are equally slow, so the backlog is spread evenly
+        assert [len(d.values) for d in dis] == [5, 5, 5, 5]
+
+
+def test_substream_sensitive_merge(graph, discard):
+    graph.add_component("Merge", SubstreamSensitiveMerge)
+    dis = graph.add_component("Discard", discard)
+    graph.connect("Merge.OUT", "Discard.IN")
+    for i in range(3):
+        data = [Packet.Type.OPEN] + [(i, j) for j in range(4)] + \
+               [Packet.Type.CLOSE]
+        graph.add_component("Gen%d" % i, Passthru, IN=Stream(data))
+        graph.connect("Gen%d.OUT" % i, "Merge.IN[%d]" % i)
+    run_graph(graph)
+    assert len(dis.values) == 18
+    # substreams are kept intact
+    sources = [v[0] for v in dis.values if v != '']
+    assert len(set(sources[0:4])) == len(set(sources[4:8])) == \
+        len(set(sources[8:12])) == 1
+    assert sorted(sources) == [0] * 4 + [1] * 4 + [2] * 4
+
+
+def test_forked_send(graph, discard):
+    graph.add_component("Fork", Fork, IN=Stream(list(range(10))))
+    dis = []
+    for i in range(3):
+        # one receiver is slower than the others
+        graph.add_component("Pass%d" % i, SlowPass, DELAY=0.002 * (i == 1))
+        dis.append(graph.add_component("Discard%d" % i, discard))
+        graph.connect("Fork.OUT[%d]" % i, "Pass%d.IN" % i)
+        graph.connect("Pass%d.OUT" % i, "Discard%d.IN" % i)
+    run_graph(graph)
+    for d in dis:
+        assert d.values == list(range(10))
+
+
+def test_partition_by_key(graph, discard):
+    data = Stream([0, 1, 2, Packet.Type.OPEN, 4, 6, Packet.Type.CLOSE, 5, 3,
+                   Packet.Type.OPEN, Packet.Type.CLOSE, 7])
+    graph.add_component("Split", PartitionByKey, IN=data,
+                        KEY=lambda x: x % 3)
+    dis = [graph.add_component("Discard%d" % i, discard) for i in range(3)]
+    for i in range(3):
+        graph.connect("Split.OUT[%d]" % i, "Discard%d.IN" % i)
+    run_graph(graph)
+    # the substream is routed by its first data packet, and the empty
+    # substream, which has none, to the first element
+    assert dis[0].values == [0, 3, '', '']
+    assert dis[1].values == [1, '', 4, 6, '', 7]
+    assert dis[2].values == [2, 5]
+
+
+def test_partition_by_key_stable_hash():
+    from rill.components.split import _stable_hash
+    # unlike hash(), the same in every process, whatever PYTHONHASHSEED is
+    assert _stable_hash('abc') == 891568578
+    assert _stable_hash(b'abc') == 891568578
+    assert _stable_hash(('abc', 1)) == 4064247433
+    assert _stable_hash(7) == 7
+
+
+def test_partition_by_key_no_outports(graph):
+    graph.add_component("Split", PartitionByKey, IN=Stream([1]),
+                        KEY=lambda x: x)
+    with pytest.raises(FlowError):
+        run_graph(graph)
+
+
+def test_partition_by_key_ordered_merge(graph, discard):
+    data = Stream(list(range(12)))
+    graph.add_component("Split", PartitionByKey, IN=data,
+                        KEY=lambda x: x // 2)
+    graph.add_component("Merge", OrderedMerge)
+    dis = graph.add_component("Discard", discard)
+    for i in range(3):
+        graph.add_component("Pass%d" % i, SlowPass, DELAY=0.001 * i)
+        graph.connect("Split.OUT[%d]" % i, "Pass%d.IN" % i)
+        graph.connect("Pass%d.OUT" % i, "Merge.IN[%d]" % i)
+    graph.connect("Split.ROUTE", "Merge.ROUTE")
+    graph.connect("Merge.OUT", "Discard.IN")
+    run_graph(graph)
+    assert dis.values == list(range(12))
+
+
+@pytest.mark.parametrize('priorities', [(0, 0), (1, 0), (0, 1)])
+def test_priority_scheduling(priorities):
+    graph = Graph()
+    log = []
+    for name, priority in zip(['A', 'B'], priorities):
+        graph.add_component("Gen" + name, GenerateTestData, COUNT=100)
+        graph.add_component(name, Passthru)
+        graph.add_component("Log" + name, Log, LOG=log)
+        graph.connect("Gen%s.OUT" % name, "%s.IN" % name)
+        graph.connect("%s.OUT" % name, "Log%s.IN" % name)
+        graph.set_node_metadata(graph.component(name),
+                                {'priority': priority, 'yield_budget': 5})
+    run_graph(graph)
+    assert len(log) == 200
+    # the last packet from each pipeline
+    ends = {name: max(i for i, (n, _) in enumerate(log) if n == 'Log' + name)
+            for name in 'AB'}
+    if priorities[0] == priorities[1]:
+        # interleaved
+        assert abs(ends['A'] - ends['B']) < 20
+    else:
+        high, low = ('A', 'B') if priorities[0] > priorities[1] else ('B', 'A')
+        assert ends[high] < 150 < ends[low]
+
+
+def test_priority_scheduling_blocked_high_priority():
+    # a high priority component which is blocked, here sleeping between
+    # packets, must not hold up lower priority ones
+    graph = Graph()
+    log = []
+    graph.add_component("GenHigh", GenerateTestData, COUNT=10)
+    graph.add_component("High", SlowPass, DELAY=0.05)
+    graph.add_component("LogHigh", Log, LOG=log)
+    graph.connect("GenHigh.OUT", "High.IN")
+    graph.connect("High.OUT", "LogHigh.IN")
+    graph.add_component("GenLow", GenerateTestData, COUNT=200)
+    graph.add_component("Low", Passthru)
+    graph.add_component("LogLow", Log, LOG=log)
+    graph.connect("GenLow.OUT", "Low.IN")
+    graph.connect("Low.OUT", "LogLow.IN")
+    graph.set_node_metadata(graph.component("High"), {'priority': 1})
+    graph.set_node_metadata(graph.component("Low"),
+                            {'priority': 0, 'yield_budget': 5})
+    run_graph(graph)
+    assert len(log) == 210
+    assert log[-1][0] == 'LogHigh'
+
+
+def test_yield_budget():
+    graph = Graph(default_capacity=1000)
+    graph.add_component("Generate", GenerateTestData, COUNT=100)
+    dis = graph.add_component("Discard", DiscardLooper)
+    graph.connect("Generate.OUT", "Discard.IN")
+    graph.set_node_metadata(dis, {'yield_budget': 0})
+
+    # a greenlet which should get to run while Generate is busy
+    ticks = []
+
+    def ticker():
+        while True:
+            ticks.append(1)
+            gevent.sleep(0)
+
+    net = Network(graph, yield_budget=10)
+    thread = gevent.spawn(ticker)
+    net.go()
+    thread.kill()
+
+    assert len(dis.values) == 100
+    stats = net.get_starvation_stats()
+    # Discard's budget was disabled by its metadata
+    assert list(stats) == ['Generate']
+    assert stats['Generate']['forced_yields'] == 10
+    assert net.forced_yields == 10
+    assert len(ticks) >= 10
+
+
 def test_inport_default():
     graph = Graph()
     graph.add_component("Generate", GenerateTestData)
@@ -614,3 +1117,78 @@ def test_network_apply_with_outputs():
 
     assert outputs == {'OUT': 10}
 
+
+def test_network_apply_restores_graph():
+    graph = Graph()
+    graph.add_component('Add1', Add)
+    graph.export('Add1.IN1', 'IN1')
+    graph.export('Add1.IN2', 'IN2')
+    graph.export('Add1.OUT', 'OUT')
+
+    assert run_graph(graph, {'IN1': 1, 'IN2': 2}, True) == {'OUT': 3}
+    # the graph is run in place, but the initial packets and captures are
+    # removed afterwards, so it can be run again
+    assert list(graph.get_components()) == ['Add1']
+    assert not graph.inports['IN1'].is_connected()
+    assert not graph.outports['OUT'].is_connected()
+    assert run_graph(graph, {'IN1': 2, 'IN2': 2}, True) == {'OUT': 4}
+
+    with pytest.raises(FlowError):
+        run_graph(graph, {'IN3': 1})
+
+    with pytest.raises(FlowError):
+        run_graph(graph, {'IN1': 1, 'IN2': 2}, ['NOPE'])
+
+
+def test_run_graph_concurrently():
+    graph = Graph()
+    graph.add_component('Slow', SlowPass, DELAY=0.01)
+    graph.export('Slow.IN', 'IN')
+    graph.export('Slow.OUT', 'OUT')
+
+    # runs of the same graph take turns, since they share its components
+    runs = [gevent.spawn(run_graph, graph, {'IN': i}, True) for i in range(3)]
+    gevent.joinall(runs)
+    assert [run.get() for run in runs] == [{'OUT': i} for i in range(3)]
+
+    # but a greenlet waiting on its own run would never finish
+    results = iter_graph(graph, [1, 2])
+    assert next(results) == 1
+    with pytest.raises(FlowError):
+        run_graph(graph, {'IN': 3}, True)
+    assert list(results) == [2]
+    assert run_graph(graph, {'IN': 3}, True) == {'OUT': 3}
+
+
+def test_iter_graph():
+    graph = Graph()
+    graph.add_component('Add1', Add)
+    graph.export('Add1.IN1', 'IN')
+    graph.export('Add1.IN2', 'N')
+    graph.export('Add1.OUT', 'OUT')
+
+    produced = [0]
+
+    def numbers(count):
+        for i in range(count):
+            produced[0] += 1
+            yield i
+
+    total = 0
+    for i, result in enumerate(iter_graph(graph, numbers(200),
+                                          initializations={'N': 1})):
+        # backpressure: the input is only consumed as results are
+        total += result
+        assert produced[0] - (i + 1) <= 4 * graph.default_capacity
+    assert total == sum(range(1, 201))
+
+    # closing the generator early stops the network
+    results = iter_graph(graph, numbers(10 ** 9), initializations={'N': 2})
+    assert [next(results) for _ in range(3)] == [2, 3, 4]
+    results.close()
+
+    assert list(iter_graph(graph, [1, 2], initializations={'N': 3})) == [4, 5]
+
+    with pytest.raises(FlowError):
+        # more than one inport could be fed
+        iter_graph(graph, [1, 2])
@@ -1,3 +1,5 @@
+import pytest
+
 from rill.engine.runner import ComponentRunner
 from rill.runtime import Runtime
 from rill.events.listeners.memory import get_graph_messages
@@ -116,3 +118,126 @@ def test_get_graph_messages():
     }) in messages
 
 
+def test_component_cache(tmpdir, monkeypatch):
+    import os
+    import sys
+    from rill.discovery import ComponentCache
+
+    modfile = tmpdir.join('rill_cached.py')
+    modfile.write('from rill import *\n\n\n'
+                  '@component\n'
+                  '@inport("IN")\n'
+                  '@outport("OUT")\n'
+                  'def Forward(IN, OUT):\n'
+                  '    OUT.send(IN.receive())\n')
+    monkeypatch.syspath_prepend(str(tmpdir))
+    cache_path = str(tmpdir.join('cache', 'components.json'))
+
+    runtime = Runtime(ComponentCache(cache_path))
+    runtime.register_module('rill_cached')
+    specs = runtime.get_all_component_specs()
+    assert os.path.exists(cache_path)
+
+    # a fresh runtime lists the components without importing the module
+    del sys.modules['rill_cached']
+    runtime = Runtime(ComponentCache(cache_path))
+    runtime.register_module('rill_cached')
+    assert 'rill_cached' not in sys.modules
+    assert runtime.get_all_component_specs() == specs
+
+    # ...until one of them is used
+    runtime.new_graph('graph1')
+    runtime.add_node('graph1', 'Forward', 'rill_cached/Forward', {})
+    assert 'rill_cached' in sys.modules
+
+    # changing the module invalidates its entry
+    del sys.modules['rill_cached']
+    os.utime(str(modfile), (0, 0))
+    runtime = Runtime(ComponentCache(cache_path))
+    runtime.register_module('rill_cached')
+    assert 'rill_cached' in sys.modules
+    del sys.modules['rill_cached']
+
+
+def test_batched_messages():
+    import json
+    from rill.websocket import WebSocketRuntimeApplication
+
+    class FakeSocket(object):
+        def __init__(self):
+            self.frames = []
+
+        def send(self, data):
+            self.frames.append(json.loads(data))
+
+    runtime = Runtime()
+    graph, gen, passthru, outside = get_graph('My Graph')
+    runtime.add_graph('graph1', graph)
+
+    # skip __init__, which patches Connection.send
+    app = WebSocketRuntimeApplication.__new__(WebSocketRuntimeApplication)
+    app.logger = logging.getLogger(__name__)
+    app.runtime = runtime
+    app.ws = FakeSocket()
+    app.batching = False
+    app._batch = None
+
+    def request(protocol, command, payload):
+        app.ws.frames = []
+        app.on_message(json.dumps({'protocol': protocol, 'command': command,
+                                   'payload': payload}))
+        return app.ws.frames
+
+    unbatched = request('graph', 'getgraph', {'id': 'graph1'})
+    assert len(unbatched) > 1
+
+    reply, = request('runtime', 'batch', {'enable': True})
+    assert reply['payload'] == {'enable': True}
+
+    frames = request('graph', 'getgraph', {'id': 'graph1'})
+    assert len(frames) == 1
+    assert [m['command'] for m in frames[0]] == \
+        [m['command'] for m in unbatched]
+
+
+@pytest.mark.parametrize('executor_class', ['greenlet', 'process'])
+def test_executors(executor_class):
+    import gevent.event
+    from rill.executors import GreenletExecutor, ProcessExecutor
+
+    executor_class = {'greenlet': GreenletExecutor,
+                      'process': ProcessExecutor}[executor_class]
+    runtime = Runtime(executor_class=executor_class)
+    graph = Graph()
+    graph.add_component('Generate', GenerateTestData, COUNT=100)
+    graph.add_component('Discard', DiscardLooper)
+    graph.connect('Generate.OUT', 'Discard.IN')
+    runtime.add_graph('graph1', graph)
+
+    done = gevent.event.Event()
+    traced = []
+    runtime.start('graph1', done.set, traced.append)
+    assert done.wait(30)
+    assert runtime.get_status('graph1') == (True, False)
+    if executor_class is ProcessExecutor:
+        # packets are traced in the worker, and sent back to the runtime
+        assert traced
+        assert traced[0]['src'] == {'node': 'Generate', 'port': 'OUT'}
+        assert traced[-1]['summary']['packets'] == 100
+    runtime.stop('graph1')
+    assert runtime.get_status('graph1') == (False, False)
+
+
+def test_websocket_application_import(monkeypatch):
+    import sys
+    import rill.websocket
+    from rill.runtime import WebSocketRuntimeApplication
+    assert WebSocketRuntimeApplication.runtimes is \
+        rill.websocket.WebSocketRuntimeApplication.runtimes
+
+    # geventwebsocket is only needed once the class is used
+    monkeypatch.delitem(sys.modules, 'rill.websocket')
+    monkeypatch.setitem(sys.modules, 'geventwebsocket', None)
+    with pytest.raises(ImportError) as excinfo:
+        WebSocketRuntimeApplication.runtimes
+    assert 'geventwebsocket' in str(excinfo.value)
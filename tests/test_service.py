@@ -0,0 +1,130 @@
+import json
+
+import gevent
+import pytest
+from gevent import socket
+
+from rill.engine.exceptions import FlowError
+from rill.engine.network import Graph
+from rill.components.math import Add
+from rill.components.parallel import ParallelMap
+from rill.components.text import Prefix
+from rill.service import GraphService
+
+
+def add_slowly(value):
+    # later requests finish first
+    gevent.sleep(0.001 * (value % 5))
+    return value + 11
+
+
+@pytest.fixture
+def graph():
+    graph = Graph()
+    graph.add_component('Map', ParallelMap, MODE='greenlet', ORDERED=False)
+    graph.export('Map.IN', 'IN')
+    graph.export('Map.FUNC', 'FUNC')
+    graph.export('Map.BUFFER', 'BUFFER')
+    graph.export('Map.OUT', 'OUT')
+    return graph
+
+
+def test_service_calls(graph):
+    service = GraphService(graph, inport='IN',
+                           initializations={'FUNC': add_slowly, 'BUFFER': 2},
+                           max_concurrency=5)
+    service.start()
+    try:
+        # concurrent requests are matched to their own responses, even though
+        # ParallelMap sends new packets, out of order: it copies the request
+        # id from each source packet
+        calls = [gevent.spawn(service.call, i) for i in range(50)]
+        gevent.joinall(calls, raise_error=True)
+        assert [g.value for g in calls] == [i + 11 for i in range(50)]
+        assert service.call(100) == 111
+
+        metrics = service.metrics()
+        assert metrics['requests'] == 51
+        assert metrics['in_flight'] == 0
+        assert metrics['unmatched'] == 0
+        assert metrics['latency']['max'] >= metrics['latency']['p50'] > 0
+    finally:
+        service.stop()
+
+    assert not service.running
+    with pytest.raises(FlowError):
+        service.call(1)
+    # the graph is restored, so the service may be started again
+    service.start()
+    try:
+        assert service.call(1) == 12
+    finally:
+        service.stop()
+
+
+def test_service_socket(graph, tmpdir):
+    path = str(tmpdir.join('service.sock'))
+    service = GraphService(graph, initializations={
+        'FUNC': lambda x: x + 2, 'BUFFER': 4})
+    service.start()
+    server = service.serve(path)
+    try:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(path)
+        for i in range(3):
+            client.sendall(json.dumps({'id': i, 'payload': i}).encode('utf-8')
+                           + b'\n')
+        client.sendall(b'not json\n')
+        responses = client.makefile('rb')
+        messages = [json.loads(responses.readline().decode('utf-8'))
+                    for _ in range(4)]
+        client.close()
+    finally:
+        server.stop()
+        service.stop()
+
+    results = dict((m['id'], m.get('payload')) for m in messages)
+    assert results == {0: 2, 1: 3, 2: 4, None: None}
+    assert 'error' in [m for m in messages if m['id'] is None][0]
+
+
+def test_service_unmatched_response():
+    # Add creates new packets without the request id, and the service is not
+    # told that it responds in order, so the responses cannot be matched to
+    # their requests
+    graph = Graph()
+    graph.add_component('Add', Add)
+    graph.export('Add.IN1', 'IN')
+    graph.export('Add.IN2', 'N')
+    graph.export('Add.OUT', 'OUT')
+    service = GraphService(graph, inport='IN', initializations={'N': 1})
+    service.start()
+    try:
+        calls = [gevent.spawn(service.call, i, timeout=5) for i in range(3)]
+        gevent.joinall(calls)
+        for call in calls:
+            assert isinstance(call.exception, FlowError)
+        assert not service.running
+    finally:
+        service.stop()
+
+
+@pytest.mark.parametrize('options', [{'ordered': True},
+                                     {'max_concurrency': 1}])
+def test_service_ordered(options):
+    # Prefix creates new packets without the request id, but responds to
+    # requests in order
+    graph = Graph()
+    graph.add_component('Prefix', Prefix, PRE='x')
+    graph.export('Prefix.IN', 'IN')
+    graph.export('Prefix.OUT', 'OUT')
+    service = GraphService(graph, **options)
+    service.start()
+    try:
+        calls = [gevent.spawn(service.call, str(i)) for i in range(20)]
+        gevent.joinall(calls, raise_error=True)
+        assert [g.value for g in calls] == ['x{}'.format(i)
+                                           for i in range(20)]
+        assert service.metrics()['unmatched'] == 0
+    finally:
+        service.stop()
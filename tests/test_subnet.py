@@ -198,3 +198,17 @@ def test_get_spec():
     assert len(spec['inPorts']) == 2
     assert len(spec['outPorts']) == 2
 
+
+def test_spec_cache_tracks_exports():
+    graph = Graph()
+    graph.add_component('Pass', Passthru)
+    graph.export('Pass.IN', 'IN')
+    Sub = make_subgraph('Sub', graph)
+
+    spec = Sub.get_spec()
+    assert Sub.get_spec() is spec
+    assert 'OUT' not in [p['id'] for p in spec['outPorts']]
+
+    graph.export('Pass.OUT', 'OUT')
+    spec = Sub.get_spec()
+    assert 'OUT' in [p['id'] for p in spec['outPorts']]
@@ -0,0 +1,66 @@
+import rill.engine.utils
+rill.engine.utils.patch()
+
+from rill.engine.inputport import Connection
+from rill.engine.network import Graph, run_graph
+from rill.tracing import EdgeTracer
+from tests.components import *
+
+
+def run_traced(monkeypatch, graph, tracer):
+    send = Connection.send
+
+    def traced_send(self, packet, outport):
+        tracer.trace(self, packet, outport)
+        return send(self, packet, outport)
+
+    monkeypatch.setattr(Connection, 'send', traced_send)
+    run_graph(graph)
+    tracer.flush()
+    # the edges of the finished network are forgotten
+    assert not tracer._stats
+
+
+def test_edge_tracing_rate_limit(monkeypatch):
+    graph = Graph()
+    graph.add_component('Generate', GenerateTestData, COUNT=1000)
+    graph.add_component('Discard', DiscardLooper)
+    graph.connect('Generate.OUT', 'Discard.IN')
+
+    payloads = []
+    tracer = EdgeTracer(payloads.append, max_rate=5, summary_interval=60)
+    run_traced(monkeypatch, graph, tracer)
+
+    data = [p for p in payloads if 'summary' not in p]
+    summaries = [p for p in payloads if 'summary' in p]
+    assert 5 <= len(data) < 20
+    assert data[0]['src'] == {'node': 'Generate', 'port': 'OUT'}
+    assert len(summaries) == 1
+    assert summaries[0]['summary']['packets'] == 1000
+    assert summaries[0]['summary']['traced'] == len(data)
+
+
+def test_edge_tracing_metadata(monkeypatch):
+    graph = Graph()
+    graph.add_component('Generate', GenerateTestData, COUNT=50)
+    graph.add_component('Discard', DiscardLooper)
+    graph.connect('Generate.OUT', 'Discard.IN')
+    inport = graph.get_component_port('Discard.IN')
+    outport = graph.get_component_port('Generate.OUT')
+    inport._connection.metadata[outport] = {'sample_rate': 0}
+
+    payloads = []
+    tracer = EdgeTracer(payloads.append, max_rate=1000, max_length=4)
+    run_traced(monkeypatch, graph, tracer)
+
+    assert len(payloads) == 1
+    assert payloads[0]['summary']['traced'] == 0
+
+
+def test_edge_tracing_truncation():
+    tracer = EdgeTracer(None, max_length=8)
+    assert tracer._truncate([1, 2]) == [1, 2]
+    assert tracer._truncate('x' * 20) == 'xxxxxxxx...'
+    assert tracer._truncate('xyz') == 'xyz'
+    assert tracer._truncate(list(range(10))) == '[0, 1, 2...'
+    assert tracer._truncate(object).startswith('<class')
@@ -110,3 +110,13 @@ def test_to_jsonschema():
 
     schema = to_jsonschema(Company)
     assert schema == expected
+
+
+def test_schematics_loaded_lazily():
+    import subprocess
+    import sys
+    script = ("import sys, rill.engine.network, rill.runtime; "
+              "print('schematics' in sys.modules, "
+              "'geventwebsocket' in sys.modules)")
+    output = subprocess.check_output([sys.executable, '-c', script])
+    assert output.decode('utf-8').split() == ['False', 'False']